@@ -1,11 +1,14 @@
 from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.routers.pdf_router import router as pdf_router
 from app.routers.query_router import router as query_router
+from app.services.pdf_task_queue import pdf_task_queue
+from app.services.query_service import close_query_client
 from loguru import logger
 import sys
 from pathlib import Path
+from typing import Any, Dict
 
 # 添加项目根目录到Python路径，以便导入config_service
 sys.path.append(str(Path(__file__).parent.parent))
@@ -15,7 +18,9 @@ from config_service import (
     get_api_config, 
     get_logging_config,
     get_storage_config,
-    validate_config
+    should_validate_config,
+    validate_config,
+    APP_CONFIG
 )
 
 # 获取配置
@@ -25,28 +30,32 @@ logging_config = get_logging_config()
 server_config = get_server_config()
 storage_config = get_storage_config()
 
-# 配置日志
+# 配置日志，enqueue=True 使日志I/O在后台线程进行，不阻塞请求线程
 logger.remove()
 logger.add(
     sys.stdout,
     format=logging_config["format"],
-    level=logging_config["level"]
+    level=logging_config["level"],
+    enqueue=True
 )
 logger.add(
     logging_config["file_path"],
     format=logging_config["format"],
     level=logging_config["level"],
     rotation=logging_config["rotation"],
-    retention=logging_config["retention"]
+    retention=logging_config["retention"],
+    enqueue=True
 )
 
-# 创建FastAPI应用实例
+# 创建FastAPI应用实例，默认使用orjson序列化响应
 app = FastAPI(
     title=app_config["name"],
     version=app_config["version"],
     description=app_config["description"],
-    debug=app_config["debug"]
+    debug=app_config["debug"],
+    default_response_class=ORJSONResponse
 )
+app.state.config = APP_CONFIG
 
 # 配置CORS
 app.add_middleware(
@@ -58,28 +67,28 @@ app.add_middleware(
 )
 
 @app.get("/health")
-def health_check() -> JSONResponse:
+def health_check() -> Dict[str, Any]:
     """
     健康检查接口，返回应用状态信息。
     """
-    return JSONResponse({
+    return {
         "msg": "success",
         "app_name": app_config["name"],
         "version": app_config["version"],
         "status": "running"
-    })
+    }
 
 @app.get("/config")
-def get_config_info() -> JSONResponse:
+def get_config_info() -> Dict[str, Any]:
     """
     获取配置信息接口（仅用于调试）。
     """
-    return JSONResponse({
+    return {
         "server": server_config,
         "storage": storage_config,
         "api": api_config,
         "logging": logging_config
-    })
+    }
 
 # 包含路由
 app.include_router(pdf_router, prefix=api_config["prefix"])
@@ -89,17 +98,22 @@ app.include_router(query_router, prefix=api_config["prefix"])
 @app.on_event("startup")
 async def startup_event():
     """应用启动时的初始化操作"""
-    # 验证配置文件
-    if not validate_config():
+    # 验证配置文件（设置SKIP_CONFIG_VALIDATE时跳过，热重载时不再重复检查目录）
+    if should_validate_config() and validate_config() is None:
         logger.error("配置文件验证失败！")
         
-    logger.info(f"应用 {app_config['name']} v{app_config['version']} 正在启动...")
-    logger.info(f"服务器配置: {server_config['host']}:{server_config['port']}")
-    logger.info(f"调试模式: {app_config['debug']}")
-    logger.info(f"API前缀: {api_config['prefix']}")
-    logger.info(f"存储路径: {storage_config['result_path']}")
+    logger.info("应用 {} v{} 正在启动...", app_config['name'], app_config['version'])
+    logger.info("服务器配置: {}:{}", server_config['host'], server_config['port'])
+    logger.info("调试模式: {}", app_config['debug'])
+    logger.info("API前缀: {}", api_config['prefix'])
+    logger.info("存储路径: {}", storage_config['result_path'])
+    
+    # 启动PDF处理队列
+    pdf_task_queue.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """应用关闭时的清理操作"""
-    logger.info(f"应用 {app_config['name']} 正在关闭...")
+    pdf_task_queue.stop()
+    await close_query_client()
+    logger.info("应用 {} 正在关闭...", app_config['name'])
@@ -1,60 +1,73 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse
-from app.services.pdf_service import split_pdf_to_images_service
+from app.services.pdf_task_queue import pdf_task_queue
 from loguru import logger
-import threading
+from typing import Any, Dict
+import queue
 
 router = APIRouter(prefix="/pdf")
 
 @router.post("/split")
-def split_pdf_to_images(file: UploadFile = File(...)) -> JSONResponse:
+async def split_pdf_to_images(file: UploadFile = File(...)) -> Dict[str, Any]:
     """
-    接收PDF文件，立即响应成功，然后在后台处理文件。
+    接收PDF文件，提交到后台处理队列后立即响应，返回任务ID。
     
     Args:
         file: 上传的PDF文件
         
     Returns:
-        JSONResponse: 处理结果
+        处理结果
     """
     # 验证文件类型
     if not file.filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail="请上传PDF文件")
     
     try:
-        # 读取文件内容
-        pdf_bytes = file.file.read()
+        # 异步读取文件内容，读取期间事件循环可处理其他请求
+        pdf_bytes = await file.read()
         filename = file.filename
-        logger.info(f"接收到PDF文件: {filename}, 大小: {len(pdf_bytes)} 字节")
+        logger.info("接收到PDF文件: {}, 大小: {} 字节", filename, len(pdf_bytes))
         
-        # 启动后台线程处理PDF
-        def background_process():
-            try:
-                logger.info(f"开始处理PDF文件: {filename}")
-                success, message, result = split_pdf_to_images_service(pdf_bytes)
-                
-                if success:
-                    logger.info(f"PDF文件 {filename} 处理完成: {message}")
-                else:
-                    logger.error(f"PDF文件 {filename} 处理失败: {message}")
-                    
-            except Exception as e:
-                logger.error(f"PDF文件 {filename} 处理异常: {str(e)}")
-        
-        thread = threading.Thread(target=background_process, daemon=True)
-        thread.start()
+        # 提交到后台处理队列，队列已满时拒绝
+        try:
+            job_id = pdf_task_queue.submit(pdf_bytes, filename)
+        except queue.Full:
+            raise HTTPException(status_code=429, detail="处理队列已满，请稍后重试")
         
         # 立即响应成功
-        return JSONResponse({
+        return {
             "success": True,
             "message": "文件已接收，正在后台处理",
             "data": {
+                "job_id": job_id,
                 "filename": filename,
                 "file_size": len(pdf_bytes)
             }
-        })
+        }
             
+    except HTTPException:
+        raise
     except Exception as e:
         error_msg = f"文件接收失败: {str(e)}"
         logger.error(error_msg)
-        raise HTTPException(status_code=500, detail=error_msg) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=error_msg)
+
+@router.get("/status/{job_id}")
+def get_split_status(job_id: str) -> Dict[str, Any]:
+    """
+    查询PDF后台处理任务状态
+    
+    Args:
+        job_id: 提交PDF时返回的任务ID
+        
+    Returns:
+        任务状态
+    """
+    job = pdf_task_queue.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    
+    return {
+        "success": True,
+        "message": "查询成功",
+        "data": job
+    }
\ No newline at end of file
@@ -23,8 +23,8 @@ class QueryResponse(BaseModel):
     search_results: Optional[list] = None
     step: Optional[str] = None
 
-@router.post("/ask", response_model=QueryResponse)
-async def ask_question(request: QueryRequest) -> QueryResponse:
+@router.post("/ask", response_model=QueryResponse, response_model_exclude_none=True)
+async def ask_question(request: QueryRequest) -> Dict[str, Any]:
     """
     智能查询接口
     
@@ -40,21 +40,13 @@ async def ask_question(request: QueryRequest) -> QueryResponse:
         if not request.question.strip():
             raise HTTPException(status_code=400, detail="问题不能为空")
         
-        logger.info(f"收到查询请求: {request.question[:100]}...")
+        logger.info("收到查询请求: {}...", request.question[:100])
         
         # 调用查询服务处理
-        result = process_query(request.question, request.image_base64)
+        result = await process_query(request.question, request.image_base64)
         
-        return QueryResponse(
-            success=result["success"],
-            message=result["message"],
-            original_question=result.get("original_question"),
-            translated_question=result.get("translated_question"),
-            answer=result.get("answer"),
-            search_count=result.get("search_count"),
-            search_results=result.get("search_results"),
-            step=result.get("step")
-        )
+        # 结果字段与QueryResponse一致，由FastAPI按response_model校验一次
+        return result
         
     except Exception as e:
         error_msg = f"查询处理失败: {str(e)}"
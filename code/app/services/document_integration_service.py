@@ -1,14 +1,29 @@
+import asyncio
+import atexit
 import httpx
 import json
-from typing import Dict, Any
+import orjson
+from typing import Dict, Any, List, Optional
 from loguru import logger
 import sys
 from pathlib import Path
 
 # 添加项目根目录到Python路径，以便导入config_service
 sys.path.append(str(Path(__file__).parent.parent.parent))
-from config_service import get_config_value
+from config_service import APP_CONFIG
 from app.prompts.prompt_datas import DOCUMENT_INTEGRATION_PROMPT, DOCUMENT_INTEGRATION_PROMPT_SYSTEM
+from app.services.get_vl_data import JSON_HEADERS
+
+# 复用连接池的HTTP客户端，避免每次请求重新建立TCP/TLS连接
+_CLIENT = httpx.Client(
+    http2=True,
+    timeout=httpx.Timeout(600.0, connect=5.0),
+    limits=httpx.Limits(max_connections=64, max_keepalive_connections=32)
+)
+atexit.register(_CLIENT.close)
+
+# 提示词模板在导入时按占位符切分，每次请求只需拼接
+_INTEGRATION_HEAD, _, _INTEGRATION_TAIL = DOCUMENT_INTEGRATION_PROMPT.partition("{document_content}")
 
 def integrate_document_with_vllm(document_content: str) -> Dict[str, Any]:
     """
@@ -22,7 +37,7 @@ def integrate_document_with_vllm(document_content: str) -> Dict[str, Any]:
     """
     try:
         # 从配置文件获取VLLM API URL
-        vllm_api_url = get_config_value("external_services", "vllm_api_url", "http://localhost:58123/v1/chat/completions")
+        vllm_api_url = APP_CONFIG.vllm_api_url
         
         # 构建请求payload
         payload = {
@@ -34,26 +49,26 @@ def integrate_document_with_vllm(document_content: str) -> Dict[str, Any]:
                 },
                 {
                     "role": "user",
-                    "content": DOCUMENT_INTEGRATION_PROMPT.format(document_content=document_content)
+                    "content": _INTEGRATION_HEAD + document_content + _INTEGRATION_TAIL
                 }
             ],
             "max_tokens": 10000,
             "stream": False
         }
         
-        logger.info(f"发送VLLM请求到: {vllm_api_url}")
+        logger.info("发送VLLM请求到: {}", vllm_api_url)
         
         # 发送请求
-        response = httpx.post(vllm_api_url, json=payload, timeout=600)
-        logger.info(f"VLLM请求响应状态: {response.status_code}")
+        response = _CLIENT.post(vllm_api_url, content=orjson.dumps(payload), headers=JSON_HEADERS)
+        logger.info("VLLM请求响应状态: {}", response.status_code)
         
         if response.status_code == 200:
-            response_data = response.json()
+            response_data = orjson.loads(response.content)
             
             # 提取响应内容
             if "choices" in response_data and len(response_data["choices"]) > 0:
                 content = response_data["choices"][0].get("message", {}).get("content", "")
-                logger.info(f"文档整合成功，内容长度: {len(content)}")
+                logger.info("文档整合成功，内容长度: {}", len(content))
                 
                 return {
                     "success": True,
@@ -70,7 +85,8 @@ def integrate_document_with_vllm(document_content: str) -> Dict[str, Any]:
                     "content_length": 0
                 }
         else:
-            logger.error(f"VLLM请求失败: {response.status_code}, {response.text}")
+            # 响应体只记录前256个字符
+            logger.error("VLLM请求失败: {}, {}", response.status_code, response.text[:256])
             return {
                 "success": False,
                 "message": f"VLLM请求失败: {response.status_code}",
@@ -86,4 +102,104 @@ def integrate_document_with_vllm(document_content: str) -> Dict[str, Any]:
             "message": error_msg,
             "integrated_content": "",
             "content_length": 0
-        } 
\ No newline at end of file
+        }
+
+
+class StreamingDocumentIntegrator:
+    """
+    流式文档整合
+    
+    按页面顺序累积VL识别内容，累积长度达到分段阈值时立即在线程池中为该段发起
+    整合请求，无需等待全部页面识别完成；各段请求经共享连接池并发发往VLLM。
+    需在事件循环中使用。
+    """
+    
+    def __init__(self, page_ids: List[str], segment_chars: Optional[int] = None):
+        """
+        初始化流式整合器
+        
+        Args:
+            page_ids: 按文档顺序排列的全部页面标识
+            segment_chars: 触发一次整合请求的累积字符数，默认读取配置；为0时整篇文档只整合一次
+        """
+        if segment_chars is None:
+            segment_chars = APP_CONFIG.segment_chars
+        self.segment_chars = segment_chars
+        
+        self._page_ids = page_ids
+        self._cursor = 0
+        # 已识别但前序页面尚未到达的内容
+        self._ready: Dict[str, str] = {}
+        self._content_parts: List[str] = []
+        self._segment_parts: List[str] = []
+        self._segment_length = 0
+        self._pending: List[asyncio.Future] = []
+    
+    @property
+    def content(self) -> str:
+        """已按页面顺序累积的全部内容"""
+        return "".join(self._content_parts)
+    
+    def add(self, page_id: str, content: str) -> None:
+        """
+        添加一个页面的识别结果，识别失败的页面也需传入空内容以便继续推进
+        
+        Args:
+            page_id: 页面标识
+            content: 识别结果
+        """
+        self._ready[page_id] = content
+        
+        # 页面乱序完成，只按文档顺序推进连续可用的页面
+        while self._cursor < len(self._page_ids) and self._page_ids[self._cursor] in self._ready:
+            page_content = self._ready.pop(self._page_ids[self._cursor])
+            self._cursor += 1
+            if not page_content:
+                continue
+            
+            self._content_parts.append(page_content)
+            self._segment_parts.append(page_content)
+            self._segment_length += len(page_content)
+            if self.segment_chars and self._segment_length >= self.segment_chars:
+                self._start_segment()
+    
+    def _start_segment(self) -> None:
+        """为当前累积的内容发起整合请求"""
+        segment = "".join(self._segment_parts)
+        self._segment_parts = []
+        self._segment_length = 0
+        
+        logger.info("发起第 {} 段文档整合，内容长度: {}", len(self._pending) + 1, len(segment))
+        loop = asyncio.get_running_loop()
+        self._pending.append(loop.run_in_executor(None, integrate_document_with_vllm, segment))
+    
+    async def finish(self) -> Optional[Dict[str, Any]]:
+        """
+        整合剩余内容并等待所有分段完成
+        
+        Returns:
+            整合结果，格式与integrate_document_with_vllm相同；没有任何内容时返回None
+        """
+        if self._segment_parts:
+            self._start_segment()
+        
+        if not self._pending:
+            return None
+        
+        results = await asyncio.gather(*self._pending)
+        self._pending = []
+        
+        if len(results) == 1:
+            return results[0]
+        
+        for result in results:
+            if not result["success"]:
+                return result
+        
+        integrated_content = "\n\n".join(result["integrated_content"] for result in results)
+        return {
+            "success": True,
+            "message": "文档整合成功",
+            "integrated_content": integrated_content,
+            "content_length": len(integrated_content)
+        }
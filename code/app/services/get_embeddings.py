@@ -1,22 +1,166 @@
 import os
 import sys
+import asyncio
+import time
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
 from loguru import logger
 
 # 添加项目根目录到Python路径
 sys.path.append(str(Path(__file__).parent.parent.parent))
 from config_service import get_embedding_config
+from app.services.semantic_cache import query_answer_cache
 
 try:
+    import torch
+    import chromadb
     from langchain_community.embeddings import HuggingFaceEmbeddings
     from langchain_community.vectorstores import Chroma
     from langchain.text_splitter import RecursiveCharacterTextSplitter
     from langchain.schema import Document
+    from langchain_core.embeddings import Embeddings
 except ImportError as e:
-    logger.error(f"导入langchain相关模块失败: {e}")
+    logger.error("导入langchain相关模块失败: {}", e)
     logger.error("请安装: pip install langchain langchain-community chromadb sentence-transformers")
 
+# ONNX Runtime推理为可选依赖
+try:
+    import onnxruntime
+    from optimum.onnxruntime import ORTModelForFeatureExtraction
+    from transformers import AutoTokenizer
+except ImportError:
+    onnxruntime = None
+    ORTModelForFeatureExtraction = None
+    AutoTokenizer = None
+
+# 文本分割默认参数
+DEFAULT_CHUNK_SIZE = 300
+DEFAULT_CHUNK_OVERLAP = 30
+TEXT_SEPARATORS = ["\n\n", "\n", "。", "！", "？", "；", "，", " ", ""]
+
+class QueryCache:
+    """
+    线程安全的LRU + TTL查询结果缓存
+    
+    键为 (collection_name, query_hash, k)，可按集合整体失效。
+    """
+    
+    def __init__(self, max_size: int = 2000, ttl_seconds: int = 300):
+        """
+        初始化查询缓存
+        
+        Args:
+            max_size: 最大缓存条目数
+            ttl_seconds: 条目过期时间（秒）
+        """
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._cache: "OrderedDict[Tuple[str, str, int], Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key: Tuple[str, str, int]) -> Optional[Any]:
+        """获取缓存值，不存在或已过期时返回None"""
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            expire_at, value = entry
+            if expire_at <= time.monotonic():
+                del self._cache[key]
+                self.misses += 1
+                return None
+            
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def set(self, key: Tuple[str, str, int], value: Any) -> None:
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        with self._lock:
+            self._cache[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+    
+    def invalidate(self, collection_name: str) -> None:
+        """使指定集合的所有缓存失效"""
+        with self._lock:
+            for key in [key for key in self._cache if key[0] == collection_name]:
+                del self._cache[key]
+    
+    def stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._cache),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0
+            }
+
+class ONNXEmbeddings(Embeddings):
+    """
+    基于ONNX Runtime的embedding模型
+    
+    加载int8量化后的ONNX模型，接口与HuggingFaceEmbeddings一致。
+    量化模型可通过以下命令预先生成：
+    optimum-cli onnxruntime quantize --onnx_model <onnx_dir> --avx512 --per_channel -o <output_dir>
+    """
+    
+    def __init__(self, model_path: str, batch_size: int = 64, max_length: int = 512):
+        """
+        初始化ONNX embedding模型
+        
+        Args:
+            model_path: ONNX模型目录
+            batch_size: 批量编码大小
+            max_length: 最大token长度
+        """
+        # 按已安装的onnxruntime实际支持的执行器选择，CPU版onnxruntime不含CUDA执行器
+        if "CUDAExecutionProvider" in onnxruntime.get_available_providers():
+            provider = "CUDAExecutionProvider"
+        else:
+            provider = "CPUExecutionProvider"
+        self.model = ORTModelForFeatureExtraction.from_pretrained(model_path, provider=provider)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path)
+        self.batch_size = batch_size
+        self.max_length = max_length
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """批量编码文档"""
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            inputs = self.tokenizer(
+                texts[start:start + self.batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="pt"
+            ).to(self.model.device)
+            
+            with torch.inference_mode():
+                outputs = self.model(**inputs)
+            
+            # BGE模型使用CLS向量并做L2归一化
+            cls_vectors = torch.nn.functional.normalize(outputs.last_hidden_state[:, 0], p=2, dim=1)
+            vectors.extend(cls_vectors.cpu().tolist())
+        return vectors
+    
+    def embed_query(self, text: str) -> List[float]:
+        """编码查询文本"""
+        return self.embed_documents([text])[0]
+
 class EmbeddingService:
     """向量化服务类"""
     
@@ -24,56 +168,119 @@ class EmbeddingService:
         """初始化向量化服务"""
         self.config = get_embedding_config()
         self.embedding_model_path = self.config["embedding_model_path"]
+        self.embedding_backend = self.config["embedding_backend"]
+        self.embedding_onnx_path = self.config["embedding_onnx_path"]
         self.chroma_host = self.config["chroma_host"]
         self.chroma_port = self.config["chroma_port"]
         
         # 初始化embedding模型
         self.embeddings = None
-        self.vectorstore = None
+        self._chroma_client = None
+        self._stores: Dict[str, Chroma] = {}
+        self._stores_lock = threading.Lock()
+        self.query_cache = QueryCache(max_size=2000, ttl_seconds=300)
+        # 默认参数的文本分割器只构建一次
+        self._splitter = self._create_splitter(DEFAULT_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP)
+        # 查询向量缓存，重复问题不再重新编码
+        self._embed_query = lru_cache(maxsize=4096)(self._compute_query_embedding)
         self._initialize_embeddings()
     
     def _initialize_embeddings(self):
         """初始化embedding模型"""
         try:
-            logger.info(f"初始化embedding模型: {self.embedding_model_path}")
+            if self.embedding_backend == "onnx":
+                if ORTModelForFeatureExtraction is not None and os.path.exists(self.embedding_onnx_path):
+                    logger.info("初始化ONNX embedding模型: {}", self.embedding_onnx_path)
+                    try:
+                        self.embeddings = ONNXEmbeddings(self.embedding_onnx_path)
+                        logger.info("ONNX Embedding模型初始化成功")
+                        return
+                    except Exception as e:
+                        logger.warning("ONNX Embedding模型加载失败，改用HuggingFace模型: {}", e)
+                else:
+                    logger.warning("ONNX后端不可用（请安装: pip install optimum[onnxruntime] 并配置embedding_onnx_path），改用HuggingFace模型")
+            
+            logger.info("初始化embedding模型: {}", self.embedding_model_path)
             
             # 检查模型路径是否存在
             if not os.path.exists(self.embedding_model_path):
-                logger.warning(f"模型路径不存在: {self.embedding_model_path}")
+                logger.warning("模型路径不存在: {}", self.embedding_model_path)
                 logger.info("尝试从HuggingFace下载模型...")
             
-            # 初始化HuggingFace embedding模型
+            # 有GPU时使用GPU推理
+            device = 'cuda' if torch.cuda.is_available() else 'cpu'
+            
+            # 初始化HuggingFace embedding模型，批量编码以摊薄每次前向计算的开销
             self.embeddings = HuggingFaceEmbeddings(
                 model_name=self.embedding_model_path,
-                model_kwargs={'device': 'cpu'},  # 可以根据需要改为'cuda'
-                encode_kwargs={'normalize_embeddings': True}
+                model_kwargs={'device': device},
+                encode_kwargs={'normalize_embeddings': True, 'batch_size': 64}
             )
             
-            logger.info("Embedding模型初始化成功")
+            logger.info("Embedding模型初始化成功，运行设备: {}", device)
             
         except Exception as e:
-            logger.error(f"初始化embedding模型失败: {e}")
+            logger.error("初始化embedding模型失败: {}", e)
             raise
     
-    def _initialize_vectorstore(self, collection_name: str = "pdf_documents"):
-        """初始化向量数据库"""
-        try:
-            logger.info(f"初始化Chroma向量数据库: {self.chroma_host}:{self.chroma_port}")
-            
-            # 初始化Chroma向量数据库
-            self.vectorstore = Chroma(
-                embedding_function=self.embeddings,
-                collection_name=collection_name,
-                persist_directory="./chroma_db"  # 本地持久化目录
-            )
+    def _initialize_vectorstore(self, collection_name: str = "pdf_documents") -> Chroma:
+        """
+        获取指定集合的向量数据库，同一集合只初始化一次
+        
+        Args:
+            collection_name: 集合名称
             
-            logger.info("向量数据库初始化成功")
+        Returns:
+            Chroma向量数据库实例
+        """
+        store = self._stores.get(collection_name)
+        if store is not None:
+            return store
+        
+        with self._stores_lock:
+            if collection_name in self._stores:
+                return self._stores[collection_name]
             
-        except Exception as e:
-            logger.error(f"初始化向量数据库失败: {e}")
-            raise
+            try:
+                logger.info("初始化Chroma向量数据库: {}:{}", self.chroma_host, self.chroma_port)
+                
+                # 连接Chroma服务端，HNSW索引常驻服务端内存
+                if self._chroma_client is None:
+                    self._chroma_client = chromadb.HttpClient(host=self.chroma_host, port=self.chroma_port)
+                
+                # 初始化Chroma向量数据库
+                store = Chroma(
+                    client=self._chroma_client,
+                    embedding_function=self.embeddings,
+                    collection_name=collection_name
+                )
+                self._stores[collection_name] = store
+                
+                logger.info("向量数据库初始化成功")
+                return store
+                
+            except Exception as e:
+                logger.error("初始化向量数据库失败: {}", e)
+                raise
     
-    def split_text(self, text: str, chunk_size: int = 300, chunk_overlap: int = 30) -> List[Document]:
+    def _compute_query_embedding(self, query: str) -> np.ndarray:
+        """编码查询文本，返回只读向量以便安全地缓存共享"""
+        vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        vector.setflags(write=False)
+        return vector
+    
+    @staticmethod
+    def _create_splitter(chunk_size: int, chunk_overlap: int) -> RecursiveCharacterTextSplitter:
+        """创建文本分割器"""
+        return RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            length_function=len,
+            separators=TEXT_SEPARATORS
+        )
+    
+    def split_text(self, text: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                   chunk_overlap: int = DEFAULT_CHUNK_OVERLAP) -> List[str]:
         """
         将文本分割成小块
         
@@ -83,68 +290,74 @@ class EmbeddingService:
             chunk_overlap: 块之间的重叠大小
             
         Returns:
-            分割后的文档列表
+            分割后的文本块列表
         """
         try:
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=chunk_size,
-                chunk_overlap=chunk_overlap,
-                length_function=len,
-                separators=["\n\n", "\n", "。", "！", "？", "；", "，", " ", ""]
-            )
+            if (chunk_size, chunk_overlap) == (DEFAULT_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP):
+                text_splitter = self._splitter
+            else:
+                text_splitter = self._create_splitter(chunk_size, chunk_overlap)
             
-            documents = text_splitter.create_documents([text])
-            logger.info(f"文本分割完成，共 {len(documents)} 个文档块")
+            chunks = text_splitter.split_text(text)
+            logger.info("文本分割完成，共 {} 个文档块", len(chunks))
             
-            return documents
+            return chunks
             
         except Exception as e:
-            logger.error(f"文本分割失败: {e}")
+            logger.error("文本分割失败: {}", e)
             raise
     
-    def store_embeddings(self, content: str, metadata: Optional[Dict[str, Any]] = None, 
-                        collection_name: str = "pdf_documents") -> Dict[str, Any]:
+    def build_documents(self, content: str, metadata: Optional[Dict[str, Any]] = None) -> List[Document]:
         """
-        将文本内容转换为向量并存储到Chroma数据库
+        将文本内容分割为待存储的文档块
         
         Args:
             content: 要向量化的文本内容
             metadata: 元数据信息
+            
+        Returns:
+            文档块列表，内容为空时返回空列表
+        """
+        if not content.strip():
+            return []
+        
+        # 直接以合并好的元数据构建文档
+        chunk_metadata = metadata or {}
+        return [Document(page_content=chunk, metadata=chunk_metadata) for chunk in self.split_text(content)]
+    
+    def store_documents(self, documents: List[Document], collection_name: str = "pdf_documents") -> Dict[str, Any]:
+        """
+        将已分割的文档块批量向量化并存储到Chroma数据库
+        
+        Args:
+            documents: 文档块列表
             collection_name: 集合名称
             
         Returns:
             存储结果信息
         """
         try:
-            if not content.strip():
-                logger.warning("内容为空，跳过向量化")
-                return {"success": False, "message": "内容为空"}
-            
-            # 初始化向量数据库
-            self._initialize_vectorstore(collection_name)
-            
-            # 分割文本
-            documents = self.split_text(content)
-            
             if not documents:
                 logger.warning("文本分割后为空")
                 return {"success": False, "message": "文本分割后为空"}
             
-            # 添加元数据
-            if metadata:
-                for doc in documents:
-                    doc.metadata.update(metadata)
+            # 获取向量数据库
+            vectorstore = self._initialize_vectorstore(collection_name)
+            
+            # 预先生成ID
+            doc_ids = [uuid.uuid4().hex for _ in documents]
             
             # 存储到向量数据库
-            logger.info(f"开始存储 {len(documents)} 个文档到向量数据库")
+            logger.info("开始存储 {} 个文档到向量数据库", len(documents))
             
             # 使用add_documents方法添加文档
-            ids = self.vectorstore.add_documents(documents)
+            ids = vectorstore.add_documents(documents, ids=doc_ids)
             
-            # 持久化数据库
-            self.vectorstore.persist()
+            logger.info("向量化存储成功，共存储 {} 个文档", len(ids))
             
-            logger.info(f"向量化存储成功，共存储 {len(ids)} 个文档")
+            # 文档库已变化，历史检索结果和查询回答可能过时
+            self.query_cache.invalidate(collection_name)
+            query_answer_cache.clear()
             
             return {
                 "success": True,
@@ -159,6 +372,32 @@ class EmbeddingService:
             logger.error(error_msg)
             return {"success": False, "message": error_msg}
     
+    def store_embeddings(self, content: str, metadata: Optional[Dict[str, Any]] = None, 
+                        collection_name: str = "pdf_documents") -> Dict[str, Any]:
+        """
+        将文本内容转换为向量并存储到Chroma数据库
+        
+        Args:
+            content: 要向量化的文本内容
+            metadata: 元数据信息
+            collection_name: 集合名称
+            
+        Returns:
+            存储结果信息
+        """
+        if not content.strip():
+            logger.warning("内容为空，跳过向量化")
+            return {"success": False, "message": "内容为空"}
+        
+        try:
+            documents = self.build_documents(content, metadata)
+        except Exception as e:
+            error_msg = f"向量化存储失败: {e}"
+            logger.error(error_msg)
+            return {"success": False, "message": error_msg}
+        
+        return self.store_documents(documents, collection_name)
+    
     def search_similar(self, query: str, k: int = 5, collection_name: str = "pdf_documents") -> List[Dict[str, Any]]:
         """
         搜索相似文档
@@ -172,11 +411,19 @@ class EmbeddingService:
             相似文档列表
         """
         try:
-            # 初始化向量数据库
-            self._initialize_vectorstore(collection_name)
+            # 相同问题直接返回缓存的检索结果
+            cache_key = (collection_name, hashlib.blake2b(query.encode("utf-8")).hexdigest(), k)
+            cached_results = self.query_cache.get(cache_key)
+            if cached_results is not None:
+                logger.info("相似性搜索命中缓存，共 {} 个结果", len(cached_results))
+                return cached_results
+            
+            # 获取向量数据库
+            vectorstore = self._initialize_vectorstore(collection_name)
             
-            # 执行相似性搜索
-            results = self.vectorstore.similarity_search_with_score(query, k=k)
+            # 使用缓存的查询向量执行相似性搜索
+            query_vector = self._embed_query(query)
+            results = vectorstore.similarity_search_by_vector_with_relevance_scores(query_vector, k=k)
             
             # 格式化结果
             formatted_results = []
@@ -187,11 +434,12 @@ class EmbeddingService:
                     "score": float(score)
                 })
             
-            logger.info(f"相似性搜索完成，找到 {len(formatted_results)} 个结果")
+            logger.info("相似性搜索完成，找到 {} 个结果", len(formatted_results))
+            self.query_cache.set(cache_key, formatted_results)
             return formatted_results
             
         except Exception as e:
-            logger.error(f"相似性搜索失败: {e}")
+            logger.error("相似性搜索失败: {}", e)
             return []
 
 # 创建全局实例
@@ -209,15 +457,15 @@ def store_vl_content_to_vector_db(vl_content: str, metadata: Optional[Dict[str,
         存储结果
     """
     try:
-        logger.info(f"开始将VL内容存储到向量数据库，内容长度: {len(vl_content)}")
+        logger.info("开始将VL内容存储到向量数据库，内容长度: {}", len(vl_content))
         
         # 调用embedding服务存储内容
         result = embedding_service.store_embeddings(vl_content, metadata)
         
         if result["success"]:
-            logger.info(f"VL内容向量化存储成功: {result['message']}")
+            logger.info("VL内容向量化存储成功: {}", result["message"])
         else:
-            logger.error(f"VL内容向量化存储失败: {result['message']}")
+            logger.error("VL内容向量化存储失败: {}", result["message"])
         
         return result
         
@@ -225,3 +473,99 @@ def store_vl_content_to_vector_db(vl_content: str, metadata: Optional[Dict[str,
         error_msg = f"VL内容向量化存储异常: {e}"
         logger.error(error_msg)
         return {"success": False, "message": error_msg}
+
+def store_document_batch(documents: List[Document], collection_name: str = "pdf_documents") -> Dict[str, Any]:
+    """
+    批量向量化并存储多个页面的文档块：一次编码、一次写入数据库。
+    批量写入失败时逐个文档重试，避免单个异常文档导致整批内容丢失。
+    
+    Args:
+        documents: 文档块列表
+        collection_name: 集合名称
+        
+    Returns:
+        存储结果
+    """
+    result = embedding_service.store_documents(documents, collection_name)
+    if result["success"] or len(documents) <= 1:
+        return result
+    
+    logger.warning("批量向量化存储失败，逐个文档重试: {}", result["message"])
+    ids = []
+    errors = []
+    for document in documents:
+        single_result = embedding_service.store_documents([document], collection_name)
+        if single_result["success"]:
+            ids.extend(single_result["ids"])
+        else:
+            errors.append(single_result["message"])
+    
+    return {
+        "success": not errors,
+        "message": "; ".join(errors) if errors else "向量化存储成功",
+        "document_count": len(ids),
+        "ids": ids,
+        "collection_name": collection_name
+    }
+
+
+class VectorBatchWriter:
+    """
+    滚动批量向量化存储
+    
+    各页面的VL内容到达后立即分割为文档块并累积，满一个批次即在线程池中
+    向量化并写入向量数据库，调用方无需等待全部页面完成，也无需在内存中
+    保留全部内容。需在事件循环中使用。
+    """
+    
+    def __init__(self, batch_size: int = 32, collection_name: str = "pdf_documents"):
+        """
+        初始化批量写入器
+        
+        Args:
+            batch_size: 每批写入的文档块数
+            collection_name: 集合名称
+        """
+        self.batch_size = batch_size
+        self.collection_name = collection_name
+        self._buffer: List[Document] = []
+        self._pending: List[asyncio.Future] = []
+    
+    def add(self, content: str, metadata: Optional[Dict[str, Any]] = None) -> None:
+        """
+        添加一段内容，累积的文档块达到批次大小时立即开始写入
+        
+        Args:
+            content: VL识别的内容
+            metadata: 元数据信息
+        """
+        self._buffer.extend(embedding_service.build_documents(content, metadata))
+        if len(self._buffer) >= self.batch_size:
+            self._write_buffer()
+    
+    def _write_buffer(self) -> None:
+        """在线程池中写入当前缓冲的文档块"""
+        documents, self._buffer = self._buffer, []
+        loop = asyncio.get_running_loop()
+        self._pending.append(
+            loop.run_in_executor(None, store_document_batch, documents, self.collection_name)
+        )
+    
+    async def flush(self) -> Dict[str, Any]:
+        """
+        写入剩余的文档块并等待所有批次完成
+        
+        Returns:
+            汇总的存储结果
+        """
+        if self._buffer:
+            self._write_buffer()
+        
+        results = await asyncio.gather(*self._pending)
+        self._pending = []
+        
+        errors = [result["message"] for result in results if not result["success"]]
+        document_count = sum(result.get("document_count", 0) for result in results)
+        if errors:
+            return {"success": False, "message": "; ".join(errors), "document_count": document_count}
+        return {"success": True, "message": "向量化存储成功", "document_count": document_count}
@@ -1,35 +1,75 @@
 import os
-import base64
+import atexit
+import asyncio
 import httpx
 import json
-from typing import List, Dict, Any
+import orjson
+from typing import AsyncIterator, Iterator, List, Dict, Any, Tuple, Union
 from loguru import logger
 import sys
 from pathlib import Path
 
 # 添加项目根目录到Python路径，以便导入config_service
 sys.path.append(str(Path(__file__).parent.parent.parent))
-from config_service import get_config_value
+from config_service import APP_CONFIG
 
 from app.prompts.prompt_datas import PRODUCT_INFORMATION
 
+# 优先使用SIMD加速的pybase64，未安装时回退到标准库
+try:
+    from pybase64 import b64encode, b64encode_as_string
+except ImportError:
+    from base64 import b64encode
 
-def find_png_files(directory: str) -> List[str]:
+    def b64encode_as_string(data: bytes) -> str:
+        return b64encode(data).decode("ascii")
+
+# 并发VL请求上限，与vllm的max_num_seqs保持一致
+VL_MAX_CONCURRENCY = 16
+
+# orjson序列化后的请求体需显式声明类型
+JSON_HEADERS = {"content-type": "application/json"}
+
+# 文件分块Base64编码的块大小，须为3的倍数
+BASE64_CHUNK_SIZE = 48 * 1024
+
+# 复用连接池的HTTP客户端，避免每次请求重新建立TCP/TLS连接（超时时间注意vllm框架限制）
+_CLIENT = httpx.Client(
+    http2=True,
+    timeout=httpx.Timeout(600.0, connect=5.0),
+    limits=httpx.Limits(max_connections=64, max_keepalive_connections=32)
+)
+atexit.register(_CLIENT.close)
+
+
+def find_png_files(directory: str) -> Iterator[str]:
     """
     遍历目录及其子目录，查找所有的PNG文件
     
+    使用os.scandir复用目录项中缓存的文件类型信息，避免逐个stat
+    
     Args:
         directory: 要搜索的目录路径
         
     Returns:
-        PNG文件路径列表
+        PNG文件路径迭代器
     """
-    png_files = []
-    for root, dirs, files in os.walk(directory):
-        for file in files:
-            if file.endswith('.png'):
-                png_files.append(os.path.join(root, file))
-    return png_files
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        try:
+            entries = os.scandir(current)
+        except OSError as e:
+            # 与os.walk一致，跳过无法读取的目录
+            logger.warning("无法读取目录 {}: {}", current, e)
+            continue
+
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.endswith('.png') and entry.is_file(follow_symlinks=False):
+                    yield entry.path
 
 
 def file_to_base64(file_path: str) -> str:
@@ -42,17 +82,140 @@ def file_to_base64(file_path: str) -> str:
     Returns:
         Base64编码的字符串
     """
-    with open(file_path, "rb") as image_file:
-        encoded_string = base64.b64encode(image_file.read()).decode("utf-8")
-    return encoded_string
+    # 按3的倍数分块编码，各块的base64结果可直接拼接，避免同时持有整个原始文件和编码结果；
+    # 每块读入同一缓冲区并以memoryview切片编码，不为每块分配新的bytes对象
+    encoded = bytearray()
+    chunk = bytearray(BASE64_CHUNK_SIZE)
+    view = memoryview(chunk)
+    with open(file_path, "rb", buffering=1 << 20) as image_file:
+        while size := image_file.readinto(chunk):
+            encoded += b64encode(view[:size])
+    return encoded.decode("ascii")
+
+
+# 图片格式的文件头签名 -> MIME类型，Base64编码的图片按编码后的前缀匹配
+_IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "/9j/", "image/jpeg"),
+    (b"\x89PNG", "iVBOR", "image/png"),
+    (b"RIFF", "UklGR", "image/webp"),
+)
+
+# 预先构建各MIME类型的data URL前缀
+_DATA_URL_PREFIXES = {mime_type: f"data:{mime_type};base64," for _, _, mime_type in _IMAGE_SIGNATURES}
+
+
+def image_mime_type(image: Union[str, bytes]) -> str:
+    """
+    根据文件头识别图片的MIME类型，用于构建data URL
+    
+    Args:
+        image: 图片原始字节或Base64编码的图片
+        
+    Returns:
+        MIME类型，无法识别时默认为image/jpeg
+    """
+    for signature, base64_prefix, mime_type in _IMAGE_SIGNATURES:
+        if image.startswith(base64_prefix if isinstance(image, str) else signature):
+            return mime_type
+    return "image/jpeg"
 
 
-def get_vl_request(image_base64: str, url: str = None) -> str:
+def image_data_url(image: Union[str, bytes]) -> str:
+    """
+    构建图片的data URL，原始字节在发送前才编码
+    
+    前缀与Base64内容只拼接一次；已是data URL的字符串直接使用，不再复制。
+    
+    Args:
+        image: 图片原始字节、Base64编码的图片或完整的data URL
+        
+    Returns:
+        data URL
+    """
+    if isinstance(image, str):
+        if image.startswith("data:"):
+            return image
+        return _DATA_URL_PREFIXES[image_mime_type(image)] + image
+    return _DATA_URL_PREFIXES[image_mime_type(image)] + b64encode_as_string(image)
+
+
+def _build_vl_payload(image: Union[str, bytes]) -> Dict[str, Any]:
+    """
+    构建视觉语言模型请求payload
+    
+    Args:
+        image: 图片原始字节、Base64编码的图片或data URL
+        
+    Returns:
+        请求payload
+    """
+    return {
+        "model": "/function/vllm/model",
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": image_data_url(image)
+                        }
+                    },
+                    {
+                        "type": "text",
+                        "text": PRODUCT_INFORMATION
+                    }
+                ]
+            }
+        ],
+        "stream": False
+    }
+
+
+def _parse_vl_response(response: httpx.Response) -> str:
+    """
+    解析视觉语言模型响应，拼接所有choices中的content
+    
+    Args:
+        response: VL接口响应
+        
+    Returns:
+        识别结果content内容，如果失败返回空字符串
+    """
+    logger.info("VL请求响应状态: {}", response.status_code)
+
+    if response.status_code == 200:
+        response_data = orjson.loads(response.content)
+
+        # 提取所有choices中的content并拼接
+        content_parts = []
+        if "choices" in response_data:
+            for choice in response_data["choices"]:
+                if "message" in choice and "content" in choice["message"]:
+                    content = choice["message"]["content"]
+                    if content:
+                        content_parts.append(content)
+
+        # 拼接所有content
+        if content_parts:
+            result = "\n".join(content_parts)
+            logger.info("成功提取内容，长度: {}", len(result))
+            return result
+        else:
+            logger.warning("响应中没有找到有效的content")
+            return ""
+    else:
+        # 响应体只记录前256个字符
+        logger.error("VL请求失败: {}, {}", response.status_code, response.text[:256])
+        return ""
+
+
+def get_vl_request(image: Union[str, bytes], url: str = None) -> str:
     """
     发送视觉语言模型请求并返回识别结果
     
     Args:
-        image_base64: Base64编码的图片
+        image: 图片原始字节或Base64编码的图片
         url: API接口地址
         
     Returns:
@@ -60,63 +223,131 @@ def get_vl_request(image_base64: str, url: str = None) -> str:
     """
     try:
         if url is None:
-            url = get_config_value("external_services", "vl_api_url", "http://example.com/api/upload")
-
-        payload = {
-            "model": "/function/vllm/model",
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{image_base64}"
-                            }
-                        },
-                        {
-                            "type": "text",
-                            "text": PRODUCT_INFORMATION
-                        }
-                    ]
-                }
-            ],
-            "stream": False
-        }
+            url = APP_CONFIG.vl_api_url
 
-        # 超时时间注意vllm框架限制
-        response = httpx.post(url, json=payload, timeout=600)
-        logger.info(f"VL请求响应状态: {response.status_code}")
-
-        if response.status_code == 200:
-            response_data = response.json()
-
-            # 提取所有choices中的content并拼接
-            content_parts = []
-            if "choices" in response_data:
-                for choice in response_data["choices"]:
-                    if "message" in choice and "content" in choice["message"]:
-                        content = choice["message"]["content"]
-                        if content:
-                            content_parts.append(content)
-
-            # 拼接所有content
-            if content_parts:
-                result = "\n".join(content_parts)
-                logger.info(f"成功提取内容，长度: {len(result)}")
-                return result
-            else:
-                logger.warning("响应中没有找到有效的content")
-                return ""
-        else:
-            logger.error(f"VL请求失败: {response.status_code}, {response.text}")
-            return ""
+        payload = _build_vl_payload(image)
+
+        response = _CLIENT.post(url, content=orjson.dumps(payload), headers=JSON_HEADERS)
+        return _parse_vl_response(response)
+
+    except Exception as e:
+        logger.error("VL请求异常: {}", e)
+        return ""
+
+
+def _create_async_client() -> httpx.AsyncClient:
+    """创建并发VL请求使用的HTTP/2异步客户端，超时时间注意vllm框架限制"""
+    return httpx.AsyncClient(http2=True, limits=httpx.Limits(max_connections=32), timeout=600)
+
+
+async def get_vl_request_async(
+    client: httpx.AsyncClient,
+    semaphore: asyncio.Semaphore,
+    image: Union[str, bytes, Path],
+    url: str
+) -> str:
+    """
+    异步发送视觉语言模型请求并返回识别结果
+    
+    Args:
+        client: 共享的异步HTTP客户端
+        semaphore: 并发控制信号量
+        image: 图片原始字节、Base64编码的图片或图片文件路径
+        url: API接口地址
+        
+    Returns:
+        识别结果content内容，如果失败返回空字符串
+    """
+    try:
+        async with semaphore:
+            # 在信号量内读取文件并编码，同一时刻只持有并发上限数量的Base64副本
+            if isinstance(image, Path):
+                image = await asyncio.to_thread(file_to_base64, image)
+            payload = _build_vl_payload(image)
+            response = await client.post(url, content=orjson.dumps(payload), headers=JSON_HEADERS)
+        return _parse_vl_response(response)
 
     except Exception as e:
-        logger.error(f"VL请求异常: {str(e)}")
+        logger.error("VL请求异常: {}", e)
         return ""
 
 
+async def _recognize_page(
+    client: httpx.AsyncClient,
+    semaphore: asyncio.Semaphore,
+    page_id: str,
+    image: Union[str, bytes],
+    url: str
+) -> Tuple[str, str]:
+    """识别单个页面，返回 (页面标识, 识别结果)"""
+    return page_id, await get_vl_request_async(client, semaphore, image, url)
+
+
+async def iter_vl_contents(
+    images_base64: Dict[str, Union[str, bytes]],
+    url: str = None
+) -> AsyncIterator[Tuple[str, str]]:
+    """
+    并发识别所有图片，按完成顺序逐个产出结果，调用方可在其余页面仍在识别时处理已完成的页面
+    
+    Args:
+        images_base64: 字典，键为页面标识，值为图片原始字节或base64编码的图片（原始字节在发送前才编码）
+        url: API接口地址
+        
+    Yields:
+        (页面标识, 识别结果)，识别失败的页面结果为空字符串
+    """
+    if url is None:
+        url = APP_CONFIG.vl_api_url
+
+    semaphore = asyncio.Semaphore(VL_MAX_CONCURRENCY)
+    async with _create_async_client() as client:
+        tasks = [
+            asyncio.create_task(_recognize_page(client, semaphore, page_id, image, url))
+            for page_id, image in images_base64.items()
+        ]
+
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                yield await next_result
+        finally:
+            # 调用方提前结束迭代时取消未完成的请求
+            for task in tasks:
+                task.cancel()
+
+
+async def _gather_vl_requests(images: List[Union[str, bytes, Path]], url: str) -> List[str]:
+    """并发发送所有VL请求，按输入顺序返回结果"""
+    semaphore = asyncio.Semaphore(VL_MAX_CONCURRENCY)
+    async with _create_async_client() as client:
+        return await asyncio.gather(
+            *(get_vl_request_async(client, semaphore, image, url) for image in images)
+        )
+
+
+def get_vl_request_batch(images: List[Union[str, bytes, Path]], url: str = None) -> List[str]:
+    """
+    批量发送视觉语言模型请求
+    
+    所有请求通过同一HTTP/2连接并发发出，由vllm的连续批处理在GPU上合并推理。
+    内部运行独立的事件循环，不能在事件循环中调用，异步代码请使用iter_vl_contents。
+    
+    Args:
+        images: 图片原始字节、Base64编码的图片或图片文件路径（文件在发送前才读取编码）列表
+        url: API接口地址
+        
+    Returns:
+        与输入顺序一致的识别结果列表，失败的图片对应空字符串
+    """
+    if not images:
+        return []
+
+    if url is None:
+        url = APP_CONFIG.vl_api_url
+
+    return asyncio.run(_gather_vl_requests(images, url))
+
+
 def process_images_with_vl(directory: str = None) -> Dict[str, str]:
     """
     处理目录中的所有PNG图片，使用视觉语言模型进行识别
@@ -129,52 +360,45 @@ def process_images_with_vl(directory: str = None) -> Dict[str, str]:
     """
     try:
         # 从配置文件获取VL API URL
-        vl_api_url = get_config_value("external_services", "vl_api_url", "http://example.com/api/upload")
-        logger.info(f"使用VL API地址: {vl_api_url}")
+        vl_api_url = APP_CONFIG.vl_api_url
+        logger.info("使用VL API地址: {}", vl_api_url)
 
         # 使用指定目录或当前工作目录
         if directory is None:
             directory = os.getcwd()
 
-        logger.info(f"开始处理目录: {directory}")
+        logger.info("开始处理目录: {}", directory)
 
         # 查找所有PNG文件
-        png_files = find_png_files(directory)
-        logger.info(f"找到PNG文件数量: {len(png_files)}")
-
-        results = {}
-
-        for png_file in png_files:
-            logger.info(f"处理图片: {png_file}")
+        png_files = list(find_png_files(directory))
+        logger.info("找到PNG文件数量: {}", len(png_files))
 
-            # 转换为Base64
-            image_base64 = file_to_base64(png_file)
-
-            # 发送VL请求
-            content = get_vl_request(image_base64, vl_api_url)
-
-            # 存储结果
-            results[png_file] = content
+        # 一次性批量发送所有图片的VL请求，只传入文件路径，各图片在并发上限内才读取编码
+        contents = get_vl_request_batch([Path(png_file) for png_file in png_files], vl_api_url)
+        results = dict(zip(png_files, contents))
 
+        for png_file, content in results.items():
             if content:
-                logger.info(f"图片 {png_file} 识别成功")
+                logger.info("图片 {} 识别成功", png_file)
             else:
-                logger.warning(f"图片 {png_file} 识别失败或无内容")
+                logger.warning("图片 {} 识别失败或无内容", png_file)
 
-        logger.info(f"处理完成，共处理 {len(results)} 个图片")
+        logger.info("处理完成，共处理 {} 个图片", len(results))
         return results
 
     except Exception as e:
-        logger.error(f"处理图片异常: {str(e)}")
+        logger.error("处理图片异常: {}", e)
         return {}
 
 
-def process_base64_images_with_vl(images_base64: Dict[str, str], url: str = None) -> Dict[str, Any]:
+async def process_base64_images_with_vl(images_base64: Dict[str, Union[str, bytes]], url: str = None) -> Dict[str, Any]:
     """
-    处理base64编码的图片列表，使用视觉语言模型进行识别并拼接所有文档
+    处理图片列表，使用视觉语言模型进行识别并拼接所有文档
+    
+    所有页面的VL请求并发发出，按完成顺序收集结果。
     
     Args:
-        images_base64: 字典，键为页面标识，值为base64编码的图片
+        images_base64: 字典，键为页面标识，值为图片原始字节或base64编码的图片（原始字节在发送前才编码）
         url: API接口地址
         
     Returns:
@@ -191,24 +415,26 @@ def process_base64_images_with_vl(images_base64: Dict[str, str], url: str = None
                 "content_length": 0
             }
 
-        logger.info(f"开始处理 {len(images_base64)} 张图片的VL识别")
+        logger.info("开始处理 {} 张图片的VL识别", len(images_base64))
 
-        # 处理每张图片并收集结果
-        vl_results = {}
-        all_content_parts = []
-
-        for page_id, img_b64 in images_base64.items():
-            logger.info(f"处理图片 {page_id} 的VL识别")
-
-            # 调用VL请求
-            content = get_vl_request(img_b64, url)
+        if url is None:
+            url = APP_CONFIG.vl_api_url
 
+        # 按完成顺序处理结果
+        vl_results = {}
+        async for page_id, content in iter_vl_contents(images_base64, url):
             if content:
                 vl_results[page_id] = content
-                all_content_parts.append(f"=== {page_id} ===\n{content}")
-                logger.info(f"图片 {page_id} 识别成功，内容长度: {len(content)}")
+                logger.info("图片 {} 识别成功，内容长度: {}", page_id, len(content))
             else:
-                logger.warning(f"图片 {page_id} 识别失败或无内容")
+                logger.warning("图片 {} 识别失败或无内容", page_id)
+
+        # 按页面顺序拼接
+        all_content_parts = [
+            f"=== {page_id} ===\n{vl_results[page_id]}"
+            for page_id in images_base64
+            if page_id in vl_results
+        ]
 
         # 拼接所有文档内容
         combined_content = "\n\n".join(all_content_parts)
@@ -224,7 +450,7 @@ def process_base64_images_with_vl(images_base64: Dict[str, str], url: str = None
             "total_count": len(images_base64)
         }
 
-        logger.info(f"VL处理完成，共处理 {len(vl_results)} 张图片，总内容长度: {len(combined_content)}")
+        logger.info("VL处理完成，共处理 {} 张图片，总内容长度: {}", len(vl_results), len(combined_content))
 
         return result_data
 
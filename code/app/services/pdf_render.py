@@ -0,0 +1,99 @@
+from io import BytesIO
+from typing import List, Tuple
+
+import pymupdf
+from blake3 import blake3
+from PIL import Image
+
+# 本模块在进程池工作进程中导入，只依赖PyMuPDF和Pillow，避免加载向量模型等重量级依赖
+
+# 支持的页面图片格式：配置值 -> 文件扩展名
+IMAGE_FORMATS = {
+    # VL模型内部会缩放图片，JPEG q85不影响识别效果，体积约为PNG的十分之一
+    "jpeg": "jpg",
+    "png": "png",
+    # 扫描页面的WebP体积远小于PNG，可显著减少base64编码和VL上传的数据量
+    "webp": "webp",
+}
+
+
+def content_digest(data: bytes) -> str:
+    """
+    计算内容哈希，用作PDF目录名和页面图片文件名
+
+    使用SIMD加速的BLAKE3，截取128位输出，与原MD5文件名同为32个十六进制字符。
+
+    Args:
+        data: 文件内容
+
+    Returns:
+        32个字符的十六进制哈希值
+    """
+    return blake3(data).hexdigest(length=16)
+
+
+def count_pages(pdf_bytes: bytes) -> int:
+    """
+    获取PDF总页数
+
+    Args:
+        pdf_bytes: PDF文件的字节流
+
+    Returns:
+        总页数
+    """
+    with pymupdf.open(stream=pdf_bytes, filetype="pdf") as doc:
+        return doc.page_count
+
+
+def _encode_pixmap(pix: pymupdf.Pixmap, image_format: str) -> bytes:
+    """将渲染结果编码为指定格式的图片字节"""
+    if image_format == "jpeg":
+        return pix.tobytes("jpeg", jpg_quality=85)
+    if image_format == "png":
+        return pix.tobytes("png")
+
+    # PyMuPDF不支持直接输出WebP，经Pillow编码
+    pil_img = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+    buf = BytesIO()
+    pil_img.save(buf, format="WEBP", quality=85, method=4)
+    return buf.getvalue()
+
+
+def render_pages(
+    pdf_bytes: bytes,
+    start: int,
+    stop: int,
+    resolution: int,
+    image_format: str = "jpeg"
+) -> List[Tuple[int, str, str, bytes]]:
+    """
+    渲染PDF中 [start, stop) 范围内的页面并计算图片哈希，图片是否保存由调用方决定
+
+    PyMuPDF的文档对象无法跨进程传递，因此每个任务在工作进程中重新打开PDF。
+
+    Args:
+        pdf_bytes: PDF文件的字节流
+        start: 起始页索引（从0开始，包含）
+        stop: 结束页索引（不包含）
+        resolution: 渲染分辨率（DPI）
+        image_format: 图片格式，jpeg、png 或 webp
+
+    Returns:
+        按页面顺序排列的 (页码, 图片哈希, 图片文件名, 图片字节) 列表，页码从1开始
+    """
+    extension = IMAGE_FORMATS[image_format]
+
+    pages = []
+    with pymupdf.open(stream=pdf_bytes, filetype="pdf") as doc:
+        for index in range(start, stop):
+            # 在C层完成渲染和编码，不经过PIL图像对象
+            pix = doc[index].get_pixmap(dpi=resolution, alpha=False)
+
+            # 只编码一次，同一份字节用于计算哈希、保存文件和VL请求
+            img_bytes = _encode_pixmap(pix, image_format)
+            img_hash = content_digest(img_bytes)
+
+            # 使用图片哈希值作为文件名
+            pages.append((index + 1, img_hash, f"{img_hash}.{extension}", img_bytes))
+    return pages
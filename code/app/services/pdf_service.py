@@ -1,24 +1,160 @@
-import base64
-import hashlib
-import json
+import asyncio
+import atexit
+import multiprocessing
+import os
 import sys
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from pdfplumber import open as pdf_open
-from io import BytesIO
-from typing import Dict, Tuple, List, Any
+from typing import Dict, Tuple, List, Any, Optional
+import orjson
 from loguru import logger
 
-from config_service import get_storage_config
-from app.services.get_vl_data import get_vl_request
-from app.services.document_integration_service import integrate_document_with_vllm
+# uvloop为可选依赖（不支持Windows）
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+from config_service import APP_CONFIG
+from app.services.get_vl_data import iter_vl_contents, process_base64_images_with_vl
+from app.services.get_embeddings import VectorBatchWriter
+from app.services.document_integration_service import StreamingDocumentIntegrator
+from app.services.pdf_render import IMAGE_FORMATS, content_digest, count_pages, render_pages
 
 # 添加项目根目录到Python路径，以便导入config_service
 sys.path.append(str(Path(__file__).parent.parent.parent))
 
+# 页面渲染进程数，超过4个后受内存带宽限制收益不明显
+PDF_RENDER_WORKERS = min(os.cpu_count() or 1, 4)
+
+_render_executor: Optional[ProcessPoolExecutor] = None
+_render_executor_lock = threading.Lock()
+
+# 页面图片写盘线程池，写入与VL识别重叠进行
+_write_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="page-writer")
+atexit.register(_write_executor.shutdown, wait=True)
+
+
+def _ensure_dir(directory: Path) -> None:
+    """
+    确保PDF目录存在，documents目录已由validate_config在启动时创建
+
+    Args:
+        directory: PDF目录
+    """
+    try:
+        directory.mkdir(exist_ok=True)
+    except FileNotFoundError:
+        # 未经validate_config启动时documents目录可能不存在
+        directory.mkdir(parents=True, exist_ok=True)
+
+
+def _get_render_executor() -> ProcessPoolExecutor:
+    """获取页面渲染进程池，首次使用时创建并在所有PDF任务间共享"""
+    global _render_executor
+    with _render_executor_lock:
+        if _render_executor is None:
+            # spawn方式启动，避免fork带有模型和事件循环线程的主进程
+            _render_executor = ProcessPoolExecutor(
+                max_workers=PDF_RENDER_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            atexit.register(_render_executor.shutdown, wait=False, cancel_futures=True)
+            logger.info("页面渲染进程池已启动，进程数: {}", PDF_RENDER_WORKERS)
+        return _render_executor
+
+
+def _render_pdf_pages(
+    pdf_bytes: bytes,
+    total_pages: int,
+    resolution: int,
+    image_format: str
+) -> List[Tuple[int, str, str, bytes]]:
+    """
+    并行渲染PDF所有页面，按进程数将页面划分为连续区间分别渲染
+
+    Args:
+        pdf_bytes: PDF文件的字节流
+        total_pages: PDF总页数
+        resolution: 渲染分辨率（DPI）
+        image_format: 图片格式
+
+    Returns:
+        按页面顺序排列的 (页码, 图片哈希, 图片文件名, 图片字节) 列表
+    """
+    if total_pages <= 1 or PDF_RENDER_WORKERS <= 1:
+        return render_pages(pdf_bytes, 0, total_pages, resolution, image_format)
+
+    executor = _get_render_executor()
+    pages_per_task = -(-total_pages // PDF_RENDER_WORKERS)
+    futures = [
+        executor.submit(render_pages, pdf_bytes, start, min(start + pages_per_task, total_pages),
+                        resolution, image_format)
+        for start in range(0, total_pages, pages_per_task)
+    ]
+
+    pages = []
+    for future in futures:
+        pages.extend(future.result())
+    return pages
+
+
+def _run_async(coro):
+    """
+    在当前工作线程中运行协程，已安装uvloop时使用uvloop事件循环
+
+    Args:
+        coro: 要运行的协程
+
+    Returns:
+        协程的返回值
+    """
+    if uvloop is None:
+        return asyncio.run(coro)
+    with asyncio.Runner(loop_factory=uvloop.new_event_loop) as runner:
+        return runner.run(coro)
+
+
+async def _run_page_pipeline(
+    page_images: Dict[str, bytes],
+    page_metadata: Dict[str, Dict[str, Any]]
+) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """
+    以流水线方式处理所有页面：VL识别结果按完成顺序产出，立即进入滚动批量向量化存储
+    和分段文档整合，三个阶段重叠执行。识别完成的页面图片随即从page_images中移除以释放内存。
+    
+    Args:
+        page_images: 字典，键为页面标识（按文档顺序），值为页面图片字节
+        page_metadata: 字典，键为页面标识，值为该页写入向量数据库的元数据
+        
+    Returns:
+        (按页面顺序拼接的VL内容, 文档整合结果；没有识别内容时为None)
+    """
+    vector_writer = VectorBatchWriter()
+    integrator = StreamingDocumentIntegrator(list(page_images))
+
+    async for page_id, content in iter_vl_contents(page_images):
+        del page_images[page_id]
+        if content:
+            logger.info("第 {} 页VL识别成功，内容长度: {}", page_id, len(content))
+            vector_writer.add(content, page_metadata[page_id])
+        else:
+            logger.warning("第 {} 页VL识别失败或无内容", page_id)
+        integrator.add(page_id, content)
+
+    vector_result = await vector_writer.flush()
+    if vector_result["success"]:
+        logger.info("VL内容向量化存储完成，共存储 {} 个文档", vector_result["document_count"])
+    else:
+        logger.error("VL内容向量化存储失败: {}", vector_result["message"])
+
+    return integrator.content, await integrator.finish()
+
 
 def split_pdf_to_images_service(pdf_bytes: bytes) -> Tuple[bool, str, Dict[str, str]]:
     """
-    将PDF字节流按页切割为图片，计算MD5值并存储到指定文件夹。
+    将PDF字节流按页切割为图片，计算哈希值并存储到指定文件夹。
     
     Args:
         pdf_bytes: PDF文件的字节流
@@ -28,104 +164,85 @@ def split_pdf_to_images_service(pdf_bytes: bytes) -> Tuple[bool, str, Dict[str,
     """
     try:
         # 从配置获取存储路径
-        storage_config = get_storage_config()
-        result_path = storage_config["result_path"]
+        render_dpi = APP_CONFIG.render_dpi
+        image_format = APP_CONFIG.image_format
+        if image_format not in IMAGE_FORMATS:
+            logger.warning("不支持的图片格式: {}，使用jpeg", image_format)
+            image_format = "jpeg"
 
-        # 计算PDF文件的MD5值
-        md5_hash = hashlib.md5(pdf_bytes).hexdigest()
-        logger.info(f"PDF文件MD5值: {md5_hash}")
+        # 计算PDF文件的哈希值（元数据中沿用md5字段名以保持兼容，字段值为BLAKE3哈希）
+        pdf_hash = content_digest(pdf_bytes)
+        logger.info("PDF文件哈希值: {}", pdf_hash)
 
         # 创建基于配置的存储目录结构
-        documents_dir = Path(result_path) / "documents"
-        md5_dir = documents_dir / md5_hash
+        documents_dir = APP_CONFIG.result_path / "documents"
+        pdf_dir = documents_dir / pdf_hash
 
         # 确保目录存在
-        md5_dir.mkdir(parents=True, exist_ok=True)
-        logger.info(f"创建目录: {md5_dir}")
+        _ensure_dir(pdf_dir)
 
-        result = {}
         saved_files = []
-        images_base64 = {}  # 存储所有图片的base64数据
-        s = ""
-        with pdf_open(BytesIO(pdf_bytes)) as pdf:
-            total_pages = len(pdf.pages)
-            logger.info(f"PDF总页数: {total_pages}")
-
-            for i, page in enumerate(pdf.pages, start=1):
-                # 生成图片
-                pil_img = page.to_image(resolution=200).original
-
-                # 将图片转为字节流并计算MD5
-                buf = BytesIO()
-                pil_img.save(buf, format="PNG")
-                img_bytes = buf.getvalue()
-                img_md5 = hashlib.md5(img_bytes).hexdigest()
-
-                # 使用图片MD5值作为文件名
-                img_filename = f"{img_md5}.png"
-                img_path = md5_dir / img_filename
-
-                # 保存图片到文件
-                pil_img.save(img_path, format="PNG", optimize=True)
+        page_images = {}  # 页面标识 -> 图片字节
+        page_metadata = {}  # 页面标识 -> 写入向量数据库的元数据
+        total_pages = count_pages(pdf_bytes)
+        logger.info("PDF总页数: {}", total_pages)
+
+        # 多进程并行渲染、编码并计算哈希；开启持久化时页面图片在线程池中写盘，与VL识别重叠进行
+        write_futures: List[Future] = []
+        for i, img_hash, img_filename, img_bytes in _render_pdf_pages(pdf_bytes, total_pages, render_dpi, image_format):
+            if APP_CONFIG.persist_page_images:
+                img_path = pdf_dir / img_filename
+                write_futures.append(_write_executor.submit(img_path.write_bytes, img_bytes))
                 saved_files.append(str(img_path))
 
-                # 生成base64字符串并存储
-                img_b64 = base64.b64encode(img_bytes).decode()
-                images_base64[str(i)] = img_b64
-
-                # 调用VL请求获取识别结果
-
-                logger.info(f"已保存第 {i} 页: {img_filename} (MD5: {img_md5})")
-                vl_content = get_vl_request(img_b64)
-                if vl_content:
-                    s += vl_content
-                    
-                    # 将VL内容存储到向量数据库
-                    from app.services.get_embeddings import store_vl_content_to_vector_db
-                    metadata = {
-                        "page_num": i,
-                        "pdf_md5": md5_hash,
-                        "img_md5": img_md5,
-                        "source": "pdf_vl_extraction"
-                    }
-                    vector_result = store_vl_content_to_vector_db(vl_content, metadata)
-                    if vector_result["success"]:
-                        logger.info(f"第 {i} 页VL内容向量化存储成功")
-                    else:
-                        logger.warning(f"第 {i} 页VL内容向量化存储失败: {vector_result['message']}")
+            # 图片字节在发送VL请求时才编码为base64
+            page_images[str(i)] = img_bytes
+            page_metadata[str(i)] = {
+                "page_num": i,
+                "pdf_md5": pdf_hash,
+                "img_md5": img_hash,
+                "source": "pdf_vl_extraction"
+            }
+            # 逐页日志只在DEBUG级别输出，格式化推迟到级别检查之后
+            logger.debug("已渲染第 {} 页: {} (哈希: {})", i, img_filename, img_hash)
+
+        # VL识别、向量化存储与文档整合流水线执行
+        s, integration_result = _run_async(_run_page_pipeline(page_images, page_metadata))
+
+        for future in write_futures:
+            future.result()
+        if saved_files:
+            logger.info("已保存 {} 页图片到: {}", len(saved_files), pdf_dir)
 
         # 保存文件信息到元数据文件
         metadata = {
-            "md5": md5_hash,
+            "md5": pdf_hash,
             "total_pages": total_pages,
             "saved_files": saved_files,
-            "directory": str(md5_dir),
-            "storage_config": storage_config
+            "directory": str(pdf_dir),
+            "storage_config": APP_CONFIG.storage
         }
 
-        metadata_path = md5_dir / "metadata.json"
-        with open(metadata_path, 'w', encoding='utf-8') as f:
-            json.dump(metadata, f, ensure_ascii=False, indent=2)
-        logger.info(f"PDF处理完成，文件保存在: {md5_dir}")
-        if s:
-            # 调用文档整合服务获取摘要
-            integration_result = integrate_document_with_vllm(s)
+        metadata_path = pdf_dir / "metadata.json"
+        metadata_path.write_bytes(orjson.dumps(metadata, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+        logger.info("PDF处理完成，文件保存在: {}", pdf_dir)
+        if integration_result is not None:
             if integration_result["success"]:
-                logger.info(f"文档整合成功，整合后内容长度: {integration_result['content_length']}")
+                logger.info("文档整合成功，整合后内容长度: {}", integration_result['content_length'])
                 return True, "PDF处理成功", {
-                    "dir": str(md5_dir),
+                    "dir": str(pdf_dir),
                     "original_content": s,
                     "integrated_content": integration_result["integrated_content"],
                     "content_length": integration_result["content_length"]
                 }
             else:
-                logger.warning(f"文档整合失败: {integration_result['message']}")
+                logger.warning("文档整合失败: {}", integration_result['message'])
                 return True, "PDF处理成功，但文档整合失败", {
-                    "dir": str(md5_dir),
+                    "dir": str(pdf_dir),
                     "original_content": s,
                     "integration_error": integration_result["message"]
                 }
-        return True, "PDF处理成功", {"dir": str(md5_dir)}
+        return True, "PDF处理成功", {"dir": str(pdf_dir)}
 
     except Exception as e:
         error_msg = f"PDF处理失败: {str(e)}"
@@ -149,19 +266,16 @@ def process_pdf_with_vl(pdf_bytes: bytes) -> Tuple[bool, str, Dict[str, Any]]:
         if not success:
             return False, message, {}
 
-        # 导入VL处理函数
-        from app.services.get_vl_data import process_base64_images_with_vl
-
         images_base64 = pdf_result.get("images_base64", {})
         total_pages = pdf_result.get("total_pages", 0)
 
         if not images_base64:
             return False, "没有找到图片数据", {}
 
-        logger.info(f"开始处理 {len(images_base64)} 张图片的VL识别")
+        logger.info("开始处理 {} 张图片的VL识别", len(images_base64))
 
-        # 使用新的VL处理函数
-        vl_result = process_base64_images_with_vl(images_base64)
+        # 使用新的VL处理函数，所有页面并发提交给VL服务
+        vl_result = _run_async(process_base64_images_with_vl(images_base64))
 
         if not vl_result.get("success", False):
             return False, vl_result.get("message", "VL处理失败"), {}
@@ -176,8 +290,8 @@ def process_pdf_with_vl(pdf_bytes: bytes) -> Tuple[bool, str, Dict[str, Any]]:
             "content_length": vl_result.get("content_length", 0)
         }
 
-        logger.info(
-            f"PDF VL处理完成，共处理 {vl_result.get('processed_count', 0)} 页，总内容长度: {vl_result.get('content_length', 0)}")
+        logger.info("PDF VL处理完成，共处理 {} 页，总内容长度: {}",
+                    vl_result.get('processed_count', 0), vl_result.get('content_length', 0))
 
         return True, "PDF VL处理成功", result_data
 
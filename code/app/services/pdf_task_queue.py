@@ -0,0 +1,149 @@
+import queue
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+# 添加项目根目录到Python路径，以便导入config_service
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from config_service import get_task_queue_config
+from app.services.pdf_service import split_pdf_to_images_service
+
+
+class PDFTaskQueue:
+    """
+    PDF处理任务队列
+
+    有界队列 + 固定数量的工作线程，队列满时拒绝新任务，
+    避免突发上传时无限制地创建线程。
+    """
+
+    def __init__(self, workers: int = 2, max_size: int = 32, max_jobs: int = 1000):
+        """
+        初始化任务队列
+
+        Args:
+            workers: 工作线程数
+            max_size: 队列中最多等待的任务数
+            max_jobs: 最多保留的任务状态记录数
+        """
+        self.workers = workers
+        self.max_jobs = max_jobs
+        self._queue: "queue.Queue[tuple]" = queue.Queue(maxsize=max_size)
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        """启动工作线程"""
+        if self._threads:
+            return
+
+        self._stop_event.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"pdf-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info("PDF处理队列已启动，工作线程数: {}", self.workers)
+
+    def stop(self) -> None:
+        """通知工作线程在当前任务完成后退出"""
+        self._stop_event.set()
+        self._threads = []
+        logger.info("PDF处理队列已停止")
+
+    def submit(self, pdf_bytes: bytes, filename: str) -> str:
+        """
+        提交PDF处理任务
+
+        Args:
+            pdf_bytes: PDF文件的字节流
+            filename: 文件名
+
+        Returns:
+            任务ID
+
+        Raises:
+            queue.Full: 队列已满时
+        """
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "filename": filename,
+            "file_size": len(pdf_bytes),
+            "status": "queued",
+            "message": "等待处理",
+            "created_at": time.time()
+        }
+
+        with self._lock:
+            self._queue.put_nowait((job_id, pdf_bytes, filename))
+            self._jobs[job_id] = job
+            # 只保留最近的任务记录
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+
+        return job_id
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        获取任务状态
+
+        Args:
+            job_id: 任务ID
+
+        Returns:
+            任务状态信息，不存在时返回None
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _update_job(self, job_id: str, **fields: Any) -> None:
+        """更新任务状态"""
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+
+    def _worker(self) -> None:
+        """工作线程：依次从队列中取出任务并处理"""
+        while not self._stop_event.is_set():
+            try:
+                job_id, pdf_bytes, filename = self._queue.get(timeout=1)
+            except queue.Empty:
+                continue
+
+            try:
+                logger.info("开始处理PDF文件: {}", filename)
+                self._update_job(job_id, status="processing", message="正在处理")
+                success, message, result = split_pdf_to_images_service(pdf_bytes)
+
+                if success:
+                    logger.info("PDF文件 {} 处理完成: {}", filename, message)
+                    self._update_job(job_id, status="success", message=message,
+                                     dir=result.get("dir"), finished_at=time.time())
+                else:
+                    logger.error("PDF文件 {} 处理失败: {}", filename, message)
+                    self._update_job(job_id, status="failed", message=message, finished_at=time.time())
+
+            except Exception as e:
+                logger.error("PDF文件 {} 处理异常: {}", filename, e)
+                self._update_job(job_id, status="failed", message=str(e), finished_at=time.time())
+            finally:
+                self._queue.task_done()
+
+
+def _create_pdf_task_queue() -> PDFTaskQueue:
+    """根据配置文件创建任务队列"""
+    config = get_task_queue_config()
+    return PDFTaskQueue(workers=config["workers"], max_size=config["max_size"])
+
+
+# 创建全局实例
+pdf_task_queue = _create_pdf_task_queue()
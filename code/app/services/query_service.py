@@ -1,5 +1,7 @@
+import asyncio
 import httpx
 import json
+import orjson
 from typing import Dict, Any, List
 from loguru import logger
 import sys
@@ -7,7 +9,7 @@ from pathlib import Path
 
 # 添加项目根目录到Python路径
 sys.path.append(str(Path(__file__).parent.parent.parent))
-from config_service import get_config_value
+from config_service import APP_CONFIG
 from app.prompts.prompt_datas import (
     TRANSLATION_PROMPT, 
     TRANSLATION_SYSTEM,
@@ -15,9 +17,32 @@ from app.prompts.prompt_datas import (
     QUERY_ANSWER_SYSTEM
 )
 from app.services.get_embeddings import embedding_service
-from app.services.get_vl_data import get_vl_request
+from app.services.get_vl_data import JSON_HEADERS, get_vl_request, image_data_url
+from app.services.semantic_cache import query_answer_cache
 
-def translate_to_chinese(content: str) -> Dict[str, Any]:
+# 复用连接池的HTTP/2异步客户端，避免每次查询重新建立TCP/TLS连接（各请求单独指定超时时间）
+_CLIENT = httpx.AsyncClient(
+    http2=True,
+    timeout=httpx.Timeout(120.0, connect=5.0),
+    limits=httpx.Limits(max_connections=32, max_keepalive_connections=16)
+)
+
+# 提示词模板在导入时按占位符切分，每次请求只需拼接，不再解析格式串（模板中没有转义的花括号）
+_TRANSLATION_HEAD, _, _TRANSLATION_TAIL = TRANSLATION_PROMPT.partition("{content}")
+_ANSWER_HEAD, _, _ANSWER_REST = QUERY_ANSWER_PROMPT.partition("{user_question}")
+_ANSWER_MIDDLE, _, _ANSWER_TAIL = _ANSWER_REST.partition("{retrieved_content}")
+
+
+def _build_answer_prompt(user_question: str, retrieved_content: str) -> str:
+    """填充回答提示词模板"""
+    return _ANSWER_HEAD + user_question + _ANSWER_MIDDLE + retrieved_content + _ANSWER_TAIL
+
+
+async def close_query_client() -> None:
+    """关闭查询服务的HTTP客户端，在应用关闭时调用"""
+    await _CLIENT.aclose()
+
+async def translate_to_chinese(content: str) -> Dict[str, Any]:
     """
     将用户输入翻译成中文
     
@@ -29,7 +54,7 @@ def translate_to_chinese(content: str) -> Dict[str, Any]:
     """
     try:
         # 使用现有的VLLM API配置
-        vllm_api_url = get_config_value("external_services", "vllm_api_url", "http://localhost:58123/v1/chat/completions")
+        vllm_api_url = APP_CONFIG.vllm_api_url
         
         payload = {
             "model": "/models/qwen2.5-7b",
@@ -40,37 +65,37 @@ def translate_to_chinese(content: str) -> Dict[str, Any]:
                 },
                 {
                     "role": "user",
-                    "content": TRANSLATION_PROMPT.format(content=content)
+                    "content": _TRANSLATION_HEAD + content + _TRANSLATION_TAIL
                 }
             ],
             "max_tokens": 1000,
             "stream": False
         }
         
-        logger.info(f"发送翻译请求: {content}")
+        logger.info("发送翻译请求: {}", content)
         
-        response = httpx.post(vllm_api_url, json=payload, timeout=60)
+        response = await _CLIENT.post(vllm_api_url, content=orjson.dumps(payload), headers=JSON_HEADERS, timeout=60)
         
         if response.status_code == 200:
-            response_data = response.json()
+            response_data = orjson.loads(response.content)
             if "choices" in response_data and len(response_data["choices"]) > 0:
                 translated_content = response_data["choices"][0].get("message", {}).get("content", "")
-                logger.info(f"翻译成功: {content} -> {translated_content}")
+                logger.info("翻译成功: {} -> {}", content, translated_content)
                 return {
                     "success": True,
                     "translated_content": translated_content.strip()
                 }
         
-        logger.error(f"翻译失败: {response.status_code}")
+        logger.error("翻译失败: {}", response.status_code)
         return {"success": False, "message": "翻译失败"}
         
     except Exception as e:
-        logger.error(f"翻译异常: {e}")
+        logger.error("翻译异常: {}", e)
         return {"success": False, "message": str(e)}
 
-def search_similar_documents(query: str, k: int = 5) -> List[Dict[str, Any]]:
+async def search_similar_documents(query: str, k: int = 5) -> List[Dict[str, Any]]:
     """
-    在向量数据库中搜索相似文档
+    在向量数据库中搜索相似文档，向量化与检索在线程池中进行，不阻塞事件循环
     
     Args:
         query: 查询内容
@@ -80,16 +105,17 @@ def search_similar_documents(query: str, k: int = 5) -> List[Dict[str, Any]]:
         相似文档列表
     """
     try:
-        logger.info(f"搜索相似文档: {query}")
-        results = embedding_service.search_similar(query, k=k)
-        logger.info(f"找到 {len(results)} 个相似文档")
+        logger.info("搜索相似文档: {}", query)
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(None, embedding_service.search_similar, query, k)
+        logger.info("找到 {} 个相似文档", len(results))
         return results
         
     except Exception as e:
-        logger.error(f"搜索相似文档失败: {e}")
+        logger.error("搜索相似文档失败: {}", e)
         return []
 
-def get_answer_with_vl(user_question: str, retrieved_content: str, image_base64: str = None) -> Dict[str, Any]:
+async def get_answer_with_vl(user_question: str, retrieved_content: str, image_base64: str = None) -> Dict[str, Any]:
     """
     使用VL模型获取答案
     
@@ -103,7 +129,7 @@ def get_answer_with_vl(user_question: str, retrieved_content: str, image_base64:
     """
     try:
         # 使用现有的VLLM API配置
-        vllm_api_url = get_config_value("external_services", "vllm_api_url", "http://localhost:58123/v1/chat/completions")
+        vllm_api_url = APP_CONFIG.vllm_api_url
         
         # 构建消息内容
         if image_base64:
@@ -119,15 +145,12 @@ def get_answer_with_vl(user_question: str, retrieved_content: str, image_base64:
                         {
                             "type": "image_url",
                             "image_url": {
-                                "url": f"data:image/jpeg;base64,{image_base64}"
+                                "url": image_data_url(image_base64)
                             }
                         },
                         {
                             "type": "text",
-                            "text": QUERY_ANSWER_PROMPT.format(
-                                user_question=user_question,
-                                retrieved_content=retrieved_content
-                            )
+                            "text": _build_answer_prompt(user_question, retrieved_content)
                         }
                     ]
                 }
@@ -141,10 +164,7 @@ def get_answer_with_vl(user_question: str, retrieved_content: str, image_base64:
                 },
                 {
                     "role": "user",
-                    "content": QUERY_ANSWER_PROMPT.format(
-                        user_question=user_question,
-                        retrieved_content=retrieved_content
-                    )
+                    "content": _build_answer_prompt(user_question, retrieved_content)
                 }
             ]
         
@@ -155,28 +175,28 @@ def get_answer_with_vl(user_question: str, retrieved_content: str, image_base64:
             "stream": False
         }
         
-        logger.info(f"发送VL回答请求")
+        logger.info("发送VL回答请求")
         
-        response = httpx.post(vllm_api_url, json=payload, timeout=120)
+        response = await _CLIENT.post(vllm_api_url, content=orjson.dumps(payload), headers=JSON_HEADERS, timeout=120)
         
         if response.status_code == 200:
-            response_data = response.json()
+            response_data = orjson.loads(response.content)
             if "choices" in response_data and len(response_data["choices"]) > 0:
                 answer = response_data["choices"][0].get("message", {}).get("content", "")
-                logger.info(f"VL回答成功，答案长度: {len(answer)}")
+                logger.info("VL回答成功，答案长度: {}", len(answer))
                 return {
                     "success": True,
                     "answer": answer.strip()
                 }
         
-        logger.error(f"VL回答失败: {response.status_code}")
+        logger.error("VL回答失败: {}", response.status_code)
         return {"success": False, "message": "VL回答失败"}
         
     except Exception as e:
-        logger.error(f"VL回答异常: {e}")
+        logger.error("VL回答异常: {}", e)
         return {"success": False, "message": str(e)}
 
-def process_query(user_question: str, image_base64: str = None) -> Dict[str, Any]:
+async def process_query(user_question: str, image_base64: str = None) -> Dict[str, Any]:
     """
     处理用户查询的完整流程
     
@@ -188,22 +208,44 @@ def process_query(user_question: str, image_base64: str = None) -> Dict[str, Any
         处理结果
     """
     try:
-        logger.info(f"开始处理用户查询: {user_question}")
+        logger.info("开始处理用户查询: {}", user_question)
         
-        # 1. 翻译成中文
-        translation_result = translate_to_chinese(user_question)
-        if not translation_result["success"]:
-            return {
-                "success": False,
-                "message": f"翻译失败: {translation_result['message']}",
-                "step": "translation"
-            }
-        
-        translated_question = translation_result["translated_content"]
-        logger.info(f"翻译结果: {translated_question}")
+        # 1. 翻译成中文，同时以原问题进行推测性检索：问题本身为中文时翻译结果不变，可直接复用检索结果
+        loop = asyncio.get_running_loop()
+        speculative_search = asyncio.create_task(search_similar_documents(user_question, k=3))
+        try:
+            translation_result = await translate_to_chinese(user_question)
+            if not translation_result["success"]:
+                return {
+                    "success": False,
+                    "message": f"翻译失败: {translation_result['message']}",
+                    "step": "translation"
+                }
+            
+            translated_question = translation_result["translated_content"]
+            logger.info("翻译结果: {}", translated_question)
+            
+            # 纯文本问题先查询语义缓存，语义相似的问题直接复用历史回答
+            cache_key = None
+            if not image_base64:
+                cached_result, cache_key = await loop.run_in_executor(
+                    None, query_answer_cache.lookup, translated_question
+                )
+                if cached_result is not None:
+                    return {
+                        **cached_result,
+                        "original_question": user_question,
+                        "translated_question": translated_question
+                    }
+            
+            # 2. 向量数据库检索，翻译结果与原问题不同时丢弃推测性检索
+            if translated_question == user_question.strip():
+                search_results = await speculative_search
+            else:
+                search_results = await search_similar_documents(translated_question, k=3)
+        finally:
+            speculative_search.cancel()
         
-        # 2. 向量数据库检索
-        search_results = search_similar_documents(translated_question, k=3)
         if not search_results:
             return {
                 "success": False,
@@ -218,10 +260,10 @@ def process_query(user_question: str, image_base64: str = None) -> Dict[str, Any
             for i, result in enumerate(search_results)
         ])
         
-        logger.info(f"检索到 {len(search_results)} 个相关文档")
+        logger.info("检索到 {} 个相关文档", len(search_results))
         
         # 4. 使用VL模型获取答案
-        answer_result = get_answer_with_vl(user_question, retrieved_content, image_base64)
+        answer_result = await get_answer_with_vl(user_question, retrieved_content, image_base64)
         if not answer_result["success"]:
             return {
                 "success": False,
@@ -232,7 +274,7 @@ def process_query(user_question: str, image_base64: str = None) -> Dict[str, Any
             }
         
         # 5. 返回完整结果
-        return {
+        result = {
             "success": True,
             "message": "查询处理成功",
             "original_question": user_question,
@@ -241,6 +283,8 @@ def process_query(user_question: str, image_base64: str = None) -> Dict[str, Any
             "answer": answer_result["answer"],
             "search_count": len(search_results)
         }
+        query_answer_cache.store(cache_key, result)
+        return result
         
     except Exception as e:
         error_msg = f"查询处理异常: {e}"
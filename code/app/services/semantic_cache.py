@@ -0,0 +1,156 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+# 添加项目根目录到Python路径，以便导入config_service
+sys.path.append(str(Path(__file__).parent.parent.parent))
+from config_service import get_semantic_cache_config
+
+
+class SemanticCache:
+    """
+    语义缓存类
+
+    以embedding向量为键缓存大模型响应，当新输入与历史输入的余弦相似度
+    达到阈值时直接返回历史响应，跳过一次完整的大模型推理。
+    条目按LRU淘汰，并在TTL到期后失效。
+    """
+
+    def __init__(self, name: str, enabled: bool = True, similarity_threshold: float = 0.95,
+                 max_size: int = 1000, ttl_seconds: int = 3600):
+        """
+        初始化语义缓存
+
+        Args:
+            name: 缓存名称，用于日志
+            enabled: 是否启用
+            similarity_threshold: 命中所需的最小余弦相似度
+            max_size: 最大缓存条目数
+            ttl_seconds: 条目过期时间（秒）
+        """
+        self.name = name
+        self.enabled = enabled
+        self.similarity_threshold = similarity_threshold
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+
+        self._lock = threading.RLock()
+        # 向量矩阵在首次写入时按embedding维度分配，每行对应一个缓存槽
+        self._vectors: Optional[np.ndarray] = None
+        # 每个槽的过期时间，0表示空槽
+        self._expire_at = np.zeros(max_size, dtype=np.float64)
+        self._values: List[Any] = [None] * max_size
+        # 已占用的槽，按最近使用顺序排列
+        self._lru: "OrderedDict[int, None]" = OrderedDict()
+        self._free_slots = list(range(max_size - 1, -1, -1))
+
+        self.hits = 0
+        self.misses = 0
+
+    def _embed(self, text: str) -> np.ndarray:
+        """使用向量化服务的embedding模型编码文本（向量已归一化，点积即余弦相似度）"""
+        from app.services.get_embeddings import embedding_service
+        return np.asarray(embedding_service.embeddings.embed_query(text), dtype=np.float32)
+
+    def lookup(self, text: str) -> Tuple[Optional[Any], Optional[np.ndarray]]:
+        """
+        查找语义相似的缓存响应
+
+        Args:
+            text: 输入文本
+
+        Returns:
+            (缓存的响应, 输入向量)，未命中时响应为None；
+            输入向量需传给store以避免重复编码，缓存未启用或编码失败时为None
+        """
+        if not self.enabled:
+            return None, None
+
+        try:
+            embedding = self._embed(text)
+        except Exception as e:
+            logger.warning("语义缓存[{}]编码失败，跳过缓存: {}", self.name, e)
+            return None, None
+
+        with self._lock:
+            if self._vectors is not None and self._lru:
+                scores = self._vectors @ embedding
+                scores[self._expire_at <= time.monotonic()] = -np.inf
+                slot = int(np.argmax(scores))
+                if scores[slot] >= self.similarity_threshold:
+                    self._lru.move_to_end(slot)
+                    self.hits += 1
+                    logger.info("语义缓存[{}]命中，相似度: {:.4f}", self.name, scores[slot])
+                    return self._values[slot], embedding
+
+            self.misses += 1
+            return None, embedding
+
+    def store(self, embedding: Optional[np.ndarray], value: Any) -> None:
+        """
+        写入缓存
+
+        Args:
+            embedding: lookup返回的输入向量，为None时不写入
+            value: 要缓存的响应
+        """
+        if embedding is None or not self.enabled:
+            return
+
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_size, embedding.shape[0]), dtype=np.float32)
+
+            if self._free_slots:
+                slot = self._free_slots.pop()
+            else:
+                # 淘汰最久未使用的条目
+                slot, _ = self._lru.popitem(last=False)
+
+            self._vectors[slot] = embedding
+            self._values[slot] = value
+            self._expire_at[slot] = time.monotonic() + self.ttl_seconds
+            self._lru[slot] = None
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._expire_at[:] = 0
+            self._values = [None] * self.max_size
+            self._lru.clear()
+            self._free_slots = list(range(self.max_size - 1, -1, -1))
+
+    def stats(self) -> dict:
+        """获取缓存统计信息"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._lru),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0
+            }
+
+
+def _create_semantic_cache(name: str) -> SemanticCache:
+    """根据配置文件创建语义缓存"""
+    config = get_semantic_cache_config()
+    return SemanticCache(
+        name,
+        enabled=config["enabled"],
+        similarity_threshold=config["similarity_threshold"],
+        max_size=config["max_size"],
+        ttl_seconds=config["ttl_seconds"]
+    )
+
+
+# 创建全局实例
+# 文档整合不使用语义缓存：embedding模型只编码输入的前512个token，
+# 开头相同（封面、目录、模板页眉）的不同文档会得到相同的缓存键
+query_answer_cache = _create_semantic_cache("query_answer")
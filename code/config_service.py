@@ -3,53 +3,80 @@
 配置文件管理服务
 提供统一的配置文件读取和管理功能
 """
+import os
 import tomllib
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
 from typing import Dict, Any, Optional, Union
 from loguru import logger
 
 
-def load_config(config_path: Optional[str] = None) -> Dict[str, Any]:
+# 默认配置文件路径：项目根目录下的config.toml
+DEFAULT_CONFIG_PATH = str((Path(__file__).parent / "config.toml").resolve())
+
+# 设置该环境变量后跳过启动时的配置验证（生产镜像或热重载时使用）
+SKIP_VALIDATE_ENV = "SKIP_CONFIG_VALIDATE"
+
+
+@lru_cache(maxsize=4)
+def _load_config_file(config_path: str) -> Dict[str, Any]:
     """
-    加载完整的配置文件
+    读取并解析配置文件，结果按解析后的绝对路径缓存，后续调用不再读取磁盘
     
     Args:
-        config_path: 配置文件路径，默认为项目根目录下的config.toml
+        config_path: 配置文件的绝对路径
     
     Returns:
         包含所有配置的字典
-    
-    Raises:
-        FileNotFoundError: 当配置文件不存在时
-        tomllib.TOMLDecodeError: 当配置文件格式错误时
     """
-    if config_path is None:
-        # 从当前文件位置找到项目根目录的config.toml
-        config_path = Path(__file__).parent / "config.toml"
-    else:
-        config_path = Path(config_path)
-    
-    if not config_path.exists():
-        logger.error(f"配置文件不存在: {config_path}")
-        raise FileNotFoundError(f"配置文件不存在: {config_path}")
+    path = Path(config_path)
+    if not path.exists():
+        logger.error("配置文件不存在: {}", path)
+        raise FileNotFoundError(f"配置文件不存在: {path}")
     
     try:
-        with open(config_path, "rb") as f:
+        with open(path, "rb") as f:
             config_data = tomllib.load(f)
         
-        logger.info(f"成功加载配置文件: {config_path}")
-        logger.debug(f"配置内容: {config_data}")
+        logger.info("成功加载配置文件: {}", path)
+        logger.debug("配置内容: {}", config_data)
         
         return config_data
         
     except tomllib.TOMLDecodeError as e:
-        logger.error(f"配置文件格式错误: {e}")
+        logger.error("配置文件格式错误: {}", e)
         raise
     except Exception as e:
-        logger.error(f"读取配置文件失败: {e}")
+        logger.error("读取配置文件失败: {}", e)
         raise
 
 
+def load_config(config_path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    加载完整的配置文件，同一文件只在首次调用时解析
+    
+    Args:
+        config_path: 配置文件路径，默认为项目根目录下的config.toml
+    
+    Returns:
+        包含所有配置的字典，为各调用方共享的缓存对象，不应修改
+    
+    Raises:
+        FileNotFoundError: 当配置文件不存在时
+        tomllib.TOMLDecodeError: 当配置文件格式错误时
+    """
+    if config_path is None:
+        return _load_config_file(DEFAULT_CONFIG_PATH)
+    return _load_config_file(str(Path(config_path).resolve()))
+
+
+def clear_config_cache() -> None:
+    """清空配置缓存，修改配置文件后调用以重新加载"""
+    _load_config_file.cache_clear()
+    logger.info("配置缓存已清空")
+
+
 def get_config_section(section_name: str, config_path: Optional[str] = None) -> Dict[str, Any]:
     """
     获取配置文件中的特定节
@@ -67,11 +94,11 @@ def get_config_section(section_name: str, config_path: Optional[str] = None) ->
     config_data = load_config(config_path)
     
     if section_name not in config_data:
-        logger.warning(f"配置节 '{section_name}' 不存在，返回空字典")
+        logger.warning("配置节 '{}' 不存在，返回空字典", section_name)
         return {}
     
     section_data = config_data[section_name]
-    logger.debug(f"获取配置节 '{section_name}': {section_data}")
+    logger.debug("获取配置节 '{}': {}", section_name, section_data)
     
     return section_data
 
@@ -98,11 +125,11 @@ def get_config_value(
         section_data = get_config_section(section_name, config_path)
         value = section_data.get(key, default_value)
         
-        logger.debug(f"获取配置值 [{section_name}].{key} = {value}")
+        logger.debug("获取配置值 [{}].{} = {}", section_name, key, value)
         return value
         
     except Exception as e:
-        logger.warning(f"获取配置值失败 [{section_name}].{key}: {e}")
+        logger.warning("获取配置值失败 [{}].{}: {}", section_name, key, e)
         return default_value
 
 
@@ -128,11 +155,11 @@ def get_server_config(config_path: Optional[str] = None) -> Dict[str, Union[str,
             "log_level": server_config.get("log_level", "info")
         }
         
-        logger.info(f"服务器配置: {config_with_defaults}")
+        logger.info("服务器配置: {}", config_with_defaults)
         return config_with_defaults
         
     except Exception as e:
-        logger.warning(f"获取服务器配置失败: {e}，使用默认配置")
+        logger.warning("获取服务器配置失败: {}，使用默认配置", e)
         return {
             "host": "0.0.0.0",
             "port": 8000,
@@ -158,18 +185,24 @@ def get_storage_config(config_path: Optional[str] = None) -> Dict[str, Union[str
         config_with_defaults = {
             "pdf_upload_path": storage_config.get("pdf_upload_path", "./data/uploads"),
             "result_path": storage_config.get("result_path", "./data/results"),
-            "max_file_size": storage_config.get("max_file_size", 50)
+            "max_file_size": storage_config.get("max_file_size", 50),
+            "render_dpi": storage_config.get("render_dpi", 150),
+            "image_format": storage_config.get("image_format", "jpeg"),
+            "persist_page_images": storage_config.get("persist_page_images", False)
         }
         
-        logger.info(f"存储配置: {config_with_defaults}")
+        logger.info("存储配置: {}", config_with_defaults)
         return config_with_defaults
         
     except Exception as e:
-        logger.warning(f"获取存储配置失败: {e}，使用默认配置")
+        logger.warning("获取存储配置失败: {}，使用默认配置", e)
         return {
             "pdf_upload_path": "./data/uploads",
             "result_path": "./data/results",
-            "max_file_size": 50
+            "max_file_size": 50,
+            "render_dpi": 150,
+            "image_format": "jpeg",
+            "persist_page_images": False
         }
 
 
@@ -193,11 +226,11 @@ def get_app_config(config_path: Optional[str] = None) -> Dict[str, Union[str, bo
             "debug": app_config.get("debug", False)
         }
         
-        logger.info(f"应用配置: {config_with_defaults}")
+        logger.info("应用配置: {}", config_with_defaults)
         return config_with_defaults
         
     except Exception as e:
-        logger.warning(f"获取应用配置失败: {e}，使用默认配置")
+        logger.warning("获取应用配置失败: {}，使用默认配置", e)
         return {
             "name": "PDF处理服务",
             "version": "0.1.0", 
@@ -226,11 +259,11 @@ def get_api_config(config_path: Optional[str] = None) -> Dict[str, Union[str, li
             "cors_headers": api_config.get("cors_headers", ["*"])
         }
         
-        logger.info(f"API配置: {config_with_defaults}")
+        logger.info("API配置: {}", config_with_defaults)
         return config_with_defaults
         
     except Exception as e:
-        logger.warning(f"获取API配置失败: {e}，使用默认配置")
+        logger.warning("获取API配置失败: {}，使用默认配置", e)
         return {
             "prefix": "/api/v1",
             "cors_origins": ["*"],
@@ -254,22 +287,88 @@ def get_embedding_config(config_path: Optional[str] = None) -> Dict[str, Union[s
         
         config_with_defaults = {
             "embedding_model_path": embedding_config.get("embedding_model_path", "/bge-large-zh-v1.5"),
+            "embedding_backend": embedding_config.get("embedding_backend", "huggingface"),
+            "embedding_onnx_path": embedding_config.get("embedding_onnx_path", ""),
             "chroma_host": embedding_config.get("chroma_host", "localhost"),
             "chroma_port": embedding_config.get("chroma_port", 8000)
         }
         
-        logger.info(f"向量模型配置: {config_with_defaults}")
+        logger.info("向量模型配置: {}", config_with_defaults)
         return config_with_defaults
         
     except Exception as e:
-        logger.warning(f"获取向量模型配置失败: {e}，使用默认配置")
+        logger.warning("获取向量模型配置失败: {}，使用默认配置", e)
         return {
             "embedding_model_path": "/bge-large-zh-v1.5",
+            "embedding_backend": "huggingface",
+            "embedding_onnx_path": "",
             "chroma_host": "localhost",
             "chroma_port": 8000
         }
 
 
+def get_semantic_cache_config(config_path: Optional[str] = None) -> Dict[str, Union[bool, int, float]]:
+    """
+    获取语义缓存配置
+    
+    Args:
+        config_path: 配置文件路径，默认为项目根目录下的config.toml
+    
+    Returns:
+        包含语义缓存配置的字典，包含默认值
+    """
+    try:
+        cache_config = get_config_section("semantic_cache", config_path)
+        
+        config_with_defaults = {
+            "enabled": cache_config.get("enabled", False),
+            "similarity_threshold": cache_config.get("similarity_threshold", 0.95),
+            "max_size": cache_config.get("max_size", 1000),
+            "ttl_seconds": cache_config.get("ttl_seconds", 3600)
+        }
+        
+        logger.info("语义缓存配置: {}", config_with_defaults)
+        return config_with_defaults
+        
+    except Exception as e:
+        logger.warning("获取语义缓存配置失败: {}，使用默认配置", e)
+        return {
+            "enabled": False,
+            "similarity_threshold": 0.95,
+            "max_size": 1000,
+            "ttl_seconds": 3600
+        }
+
+
+def get_task_queue_config(config_path: Optional[str] = None) -> Dict[str, int]:
+    """
+    获取PDF处理任务队列配置
+    
+    Args:
+        config_path: 配置文件路径，默认为项目根目录下的config.toml
+    
+    Returns:
+        包含任务队列配置的字典，包含默认值
+    """
+    try:
+        queue_config = get_config_section("task_queue", config_path)
+        
+        config_with_defaults = {
+            "workers": queue_config.get("workers", 2),
+            "max_size": queue_config.get("max_size", 32)
+        }
+        
+        logger.info("任务队列配置: {}", config_with_defaults)
+        return config_with_defaults
+        
+    except Exception as e:
+        logger.warning("获取任务队列配置失败: {}，使用默认配置", e)
+        return {
+            "workers": 2,
+            "max_size": 32
+        }
+
+
 def get_logging_config(config_path: Optional[str] = None) -> Dict[str, Union[str]]:
     """
     获取日志配置
@@ -291,11 +390,11 @@ def get_logging_config(config_path: Optional[str] = None) -> Dict[str, Union[str
             "retention": logging_config.get("retention", "30 days")
         }
         
-        logger.info(f"日志配置: {config_with_defaults}")
+        logger.info("日志配置: {}", config_with_defaults)
         return config_with_defaults
         
     except Exception as e:
-        logger.warning(f"获取日志配置失败: {e}，使用默认配置")
+        logger.warning("获取日志配置失败: {}，使用默认配置", e)
         return {
             "level": "INFO",
             "format": "{time:YYYY-MM-DD HH:mm:ss} | {level} | {name}:{function}:{line} | {message}",
@@ -305,15 +404,30 @@ def get_logging_config(config_path: Optional[str] = None) -> Dict[str, Union[str
         }
 
 
-def validate_config() -> bool:
+def should_validate_config() -> bool:
+    """
+    判断启动时是否需要验证配置文件
+    
+    Returns:
+        未设置SKIP_CONFIG_VALIDATE环境变量时为True
+    """
+    return not os.environ.get(SKIP_VALIDATE_ENV)
+
+
+def validate_config(config_path: Optional[str] = None) -> Optional[Dict[str, Any]]:
     """
     验证配置文件的完整性和正确性
     
+    解析结果写入load_config的缓存，随后的get_*_config调用不再读取磁盘。
+    
+    Args:
+        config_path: 配置文件路径，默认为项目根目录下的config.toml
+    
     Returns:
-        配置文件是否有效
+        验证通过时返回解析后的配置字典，否则返回None
     """
     try:
-        config_data = load_config()
+        config_data = load_config(config_path)
         
         # 检查必需的配置节是否存在
         required_sections = ["app", "server", "storage"]
@@ -324,16 +438,16 @@ def validate_config() -> bool:
                 missing_sections.append(section)
         
         if missing_sections:
-            logger.warning(f"缺少必需的配置节: {missing_sections}")
-            return False
+            logger.warning("缺少必需的配置节: {}", missing_sections)
+            return None
         
         # 检查服务器配置的端口是否有效
         server_config = config_data.get("server", {})
         port = server_config.get("port", 8000)
         
         if not isinstance(port, int) or port < 1 or port > 65535:
-            logger.error(f"无效的端口号: {port}")
-            return False
+            logger.error("无效的端口号: {}", port)
+            return None
         
         # 检查存储路径配置
         storage_config = config_data.get("storage", {})
@@ -346,11 +460,65 @@ def validate_config() -> bool:
                 try:
                     path_obj.mkdir(parents=True, exist_ok=True)
                 except Exception as e:
-                    logger.warning(f"无法创建目录 {path_value}: {e}")
+                    logger.warning("无法创建目录 {}: {}", path_value, e)
+        
+        # 预先创建PDF处理结果的documents目录，处理时只需创建单层目录
+        documents_dir = Path(storage_config.get("result_path", "./data/results")) / "documents"
+        try:
+            documents_dir.mkdir(parents=True, exist_ok=True)
+        except Exception as e:
+            logger.warning("无法创建目录 {}: {}", documents_dir, e)
         
         logger.info("配置文件验证通过")
-        return True
+        return config_data
         
     except Exception as e:
-        logger.error(f"配置文件验证失败: {e}")
-        return False 
\ No newline at end of file
+        logger.error("配置文件验证失败: {}", e)
+        return None
+
+
+@dataclass(frozen=True, slots=True)
+class AppConfig:
+    """
+    请求处理路径使用的运行时配置
+    
+    启动时读取一次，之后以属性访问代替每次请求调用get_*配置函数。
+    修改配置文件后需重启服务才能生效。
+    """
+    vllm_api_url: str
+    vl_api_url: str
+    result_path: Path
+    render_dpi: int
+    image_format: str
+    persist_page_images: bool
+    segment_chars: int
+    storage: Dict[str, Any]
+    
+    @classmethod
+    def load(cls, config_path: Optional[str] = None) -> "AppConfig":
+        """
+        从配置文件构建运行时配置，缺失的配置项使用各get_*函数的默认值
+        
+        Args:
+            config_path: 配置文件路径，默认为项目根目录下的config.toml
+        
+        Returns:
+            运行时配置
+        """
+        storage_config = get_storage_config(config_path)
+        return cls(
+            vllm_api_url=get_config_value(
+                "external_services", "vllm_api_url", "http://localhost:58123/v1/chat/completions", config_path
+            ),
+            vl_api_url=get_config_value("external_services", "vl_api_url", "http://example.com/api/upload", config_path),
+            result_path=Path(storage_config["result_path"]),
+            render_dpi=storage_config["render_dpi"],
+            image_format=storage_config["image_format"],
+            persist_page_images=storage_config["persist_page_images"],
+            segment_chars=get_config_value("document_integration", "segment_chars", 0, config_path),
+            storage=storage_config
+        )
+
+
+# 全局运行时配置
+APP_CONFIG = AppConfig.load()
@@ -4,21 +4,21 @@ FastAPI应用启动脚本
 """
 import uvicorn
 from loguru import logger
-from config_service import get_server_config, get_app_config, validate_config
+from config_service import get_server_config, get_app_config, should_validate_config, validate_config
 
 def main():
     """主启动函数"""
-    # 验证配置文件
-    if not validate_config():
+    # 验证配置文件（设置SKIP_CONFIG_VALIDATE时跳过）
+    if should_validate_config() and validate_config() is None:
         logger.error("配置文件验证失败，程序退出")
         return
     
-    # 获取应用和服务器配置
+    # 获取应用和服务器配置（配置文件已缓存，不再读取磁盘）
     app_config = get_app_config()
     server_config = get_server_config()
     
-    logger.info(f"正在启动 {app_config['name']} v{app_config['version']}")
-    logger.info(f"服务器配置: {server_config['host']}:{server_config['port']}")
+    logger.info("正在启动 {} v{}", app_config['name'], app_config['version'])
+    logger.info("服务器配置: {}:{}", server_config['host'], server_config['port'])
     
     # 启动服务器
     uvicorn.run(